@@ -1,27 +1,190 @@
-from telethon import events
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from loguru import logger
+from telethon import events, utils
 from telethon.tl.functions.channels import GetParticipantRequest, EditBannedRequest, EditAdminRequest
-from telethon.tl.types import ChatBannedRights, ChatAdminRights, ChannelParticipantCreator
+from telethon.tl.types import (
+    ChatBannedRights, ChatAdminRights, ChannelParticipantAdmin, ChannelParticipantCreator,
+    PeerChannel, PeerChat, UpdateChannelParticipant, UpdateChatParticipant, UpdateChatParticipantAdmin,
+    UserStatusEmpty, UserStatusLastMonth, UserStatusLastWeek, UserStatusOffline
+)
+
+import constants
+from moderation_store import ModerationStore
+from utility import ProgressMessage, RateLimiter, retry_on_flood_wait
 
-# Store chat-specific data
+# Store chat-specific data, keyed by `event.chat_id`
 chat_data = {
     # Format: {chat_id: {"muted_users": set(), "banned_users": set(), "admins": set()}}
 }
 
+# (chat_id, user_id) of every muted user, checked before anything else on each incoming message
+muted_index = set()
+
+# Persists chat_data across reconnects and restarts
+moderation_store = ModerationStore()
+
+BULK_ACTIONS = {
+    # action: (past tense, chat_data set to update, whether the user is added to it)
+    "ban": ("Banned", "banned_users", True),
+    "unban": ("Unbanned", "banned_users", False),
+    "mute": ("Muted", "muted_users", True),
+    "unmute": ("Unmuted", "muted_users", False),
+    "kick": ("Kicked", None, None),
+}
+
+BULK_SUMMARY_MAX_LINES = 50  # Per-user result lines shown before truncating
+
+SWEEP_PROGRESS = """**Sweeping {mode} accounts{dry_run}...**
+• Scanned: `{scanned}`
+• Matched: `{matched}`
+• Kicked: `{kicked}`
+• Failed: `{failed}`"""
+
+MODERATION_STATS = """**Moderation Stats**
+• Messages checked and let through: `{filtered}`
+• Muted users' messages deleted: `{deleted}`
+• Delete API calls: `{api_calls}` (saved: `{api_calls_saved}`)
+• Muted users tracked: `{muted}`"""
+
+class ParticipantCache:
+    """TTL cache of admin lookups keyed by (chat_id, user_id)."""
+
+    def __init__(self, ttl=constants.ADMIN_CACHE_TTL):
+        self._ttl = ttl
+        self._entries = {}  # (chat_id, user_id) -> (expires_at, participant)
+
+    def get(self, chat_id, user_id):
+        """Returns (hit, participant); expired entries count as misses."""
+        entry = self._entries.get((chat_id, user_id))
+        if entry is None:
+            return False, None
+        expires_at, participant = entry
+        if expires_at < time.monotonic():
+            del self._entries[(chat_id, user_id)]
+            return False, None
+        return True, participant
+
+    def set(self, chat_id, user_id, participant):
+        self._entries[(chat_id, user_id)] = (time.monotonic() + self._ttl, participant)
+
+    def invalidate(self, chat_id, user_id):
+        self._entries.pop((chat_id, user_id), None)
+
+
+class DeletionBatcher:
+    """Coalesces message deletions per chat into single `delete_messages` calls."""
+
+    def __init__(self, client, window=constants.MUTED_DELETE_WINDOW, batch_size=constants.MUTED_DELETE_BATCH_SIZE):
+        self.client = client
+        self.window = window
+        self.batch_size = batch_size
+        self._pending = {}  # chat_id -> [message ids]
+        self._timers = {}  # chat_id -> window task
+        self._flush_tasks = set()  # Window and deletion tasks, kept referenced until done
+        self.messages_deleted = 0
+        self.api_calls = 0
+
+    @property
+    def api_calls_saved(self):
+        return self.messages_deleted - self.api_calls
+
+    def add(self, chat_id, message_id):
+        """Queues a message for deletion."""
+        ids = self._pending.setdefault(chat_id, [])
+        ids.append(message_id)
+        if len(ids) >= self.batch_size:
+            self._track(asyncio.create_task(self._delete(chat_id, self._pending.pop(chat_id))))
+        elif chat_id not in self._timers:
+            self._timers[chat_id] = self._track(asyncio.create_task(self._flush_after_window(chat_id)))
+
+    def _track(self, task):
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+        return task
+
+    async def close(self):
+        """Cancels open windows and in-flight deletions, dropping any queued ids."""
+        tasks = list(self._flush_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._pending.clear()
+        self._timers.clear()
+
+    async def _flush_after_window(self, chat_id):
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            self._timers.pop(chat_id, None)
+        await self._flush(chat_id)
+
+    async def _flush(self, chat_id):
+        ids = self._pending.pop(chat_id, None)
+        if ids:
+            await self._delete(chat_id, ids)
+
+    async def _delete(self, chat_id, ids):
+        try:
+            await retry_on_flood_wait(self.client.delete_messages, chat_id, ids)
+        except Exception as e:
+            logger.error(f"Failed to delete {len(ids)} message(s) in {chat_id}: {e}")
+            return
+        self.api_calls += 1
+        self.messages_deleted += len(ids)
+
+
 class AdminManager:
     """Handles admin commands like ban, unban, mute, unmute, promote, and demote."""
 
     def __init__(self, client):
         self.client = client
+        self.messages_filtered = 0
+        self.deletion_batcher = DeletionBatcher(client)
+        self.participant_cache = ParticipantCache()
+        self._load_task = None
+
+    def start(self):
+        """Loads the persisted moderation state in the background, once per process."""
+        if not moderation_store.loaded:
+            self._load_task = asyncio.create_task(self._load_moderation_state())
+
+    async def stop(self):
+        """Stops background work tied to this client."""
+        await self.deletion_batcher.close()
+
+    async def _load_moderation_state(self):
+        """Fills chat_data and muted_index from the moderation store."""
+        rows = await moderation_store.load()
+        for chat_id, user_id, kind in rows:
+            chat_data.setdefault(chat_id, {"muted_users": set(), "banned_users": set(), "admins": set()})[kind].add(user_id)
+            if kind == "muted_users":
+                muted_index.add((chat_id, user_id))
+        logger.info(f"Loaded {len(rows)} moderation entries for {len(chat_data)} chat(s).")
 
     async def is_admin(self, chat, user_id):
         """Returns the participant object if the user is an admin, otherwise None."""
+        chat_id = utils.get_peer_id(chat)
+        hit, admin = self.participant_cache.get(chat_id, user_id)
+        if hit:
+            return admin
         try:
             participant = await self.client(GetParticipantRequest(chat, user_id))
-            if hasattr(participant.participant, 'admin_rights'):
-                return participant.participant
-            return None
         except Exception:
             return None
+        admin = participant.participant if hasattr(participant.participant, 'admin_rights') else None
+        self.participant_cache.set(chat_id, user_id, admin)
+        return admin
+
+    async def handle_participant_update(self, event):
+        """Drops cached rights of a user whose membership or admin status changed."""
+        if isinstance(event, UpdateChannelParticipant):
+            chat_id = utils.get_peer_id(PeerChannel(event.channel_id))
+        else:
+            chat_id = utils.get_peer_id(PeerChat(event.chat_id))
+        self.participant_cache.invalidate(chat_id, event.user_id)
 
     async def has_delete_rights(self, chat, user_id):
         """Checks if a user has the 'Delete Messages' admin right."""
@@ -34,18 +197,34 @@ class AdminManager:
             chat_data[chat_id] = {"muted_users": set(), "banned_users": set(), "admins": set()}
         return chat_data[chat_id]
 
+    async def _remember(self, chat_id, kind, user_id):
+        """Adds a user to one of a chat's sets and persists it."""
+        chat_info = await self._get_chat_data(chat_id)
+        chat_info[kind].add(user_id)
+        if kind == "muted_users":
+            muted_index.add((chat_id, user_id))
+        moderation_store.add(chat_id, user_id, kind)
+
+    async def _forget(self, chat_id, kind, user_id):
+        """Removes a user from one of a chat's sets and persists it."""
+        chat_info = await self._get_chat_data(chat_id)
+        chat_info[kind].discard(user_id)
+        if kind == "muted_users":
+            muted_index.discard((chat_id, user_id))
+        moderation_store.discard(chat_id, user_id, kind)
+
     async def mute_user(self, event):
         """Mutes a user in the specific chat where the command was used."""
         chat = await event.get_chat()
         sender = await event.get_sender()
 
         # Ensure sender is an admin
-        if not await self.is_admin(chat, sender.id):
+        sender_admin = await self.is_admin(chat, sender.id)
+        if not sender_admin:
             return await event.edit("You need to be an admin to use this command.")
 
         # Ensure the sender has "Delete Messages" permission
-        sender_admin = await self.is_admin(chat, sender.id)
-        if not sender_admin or not getattr(sender_admin.admin_rights, 'delete_messages', False):
+        if not getattr(sender_admin.admin_rights, 'delete_messages', False):
             return await event.edit("You need 'Delete Messages' permission to mute admins!")
 
         # Get the target user
@@ -65,10 +244,10 @@ class AdminManager:
             chat.id, target.id,
             ChatBannedRights(until_date=None, send_messages=True)
         ))
+        self.participant_cache.invalidate(event.chat_id, target.id)
 
         # Add the user to the muted list for this specific chat
-        chat_info = await self._get_chat_data(chat.id)
-        chat_info["muted_users"].add(target.id)
+        await self._remember(event.chat_id, "muted_users", target.id)
 
         await event.edit(f"Muted {target.first_name} in this chat!")
 
@@ -86,7 +265,7 @@ class AdminManager:
             return await event.edit("Reply to a user to unmute them!")
 
         # Check if the user is muted in this specific chat
-        chat_info = await self._get_chat_data(chat.id)
+        chat_info = await self._get_chat_data(event.chat_id)
         if user not in chat_info["muted_users"]:
             return await event.edit("This user is not muted in this chat!")
 
@@ -95,9 +274,10 @@ class AdminManager:
             chat.id, user,
             ChatBannedRights(until_date=None)  # Unmute the user
         ))
+        self.participant_cache.invalidate(event.chat_id, user)
 
         # Remove the user from the muted list for this specific chat
-        chat_info["muted_users"].discard(user)
+        await self._forget(event.chat_id, "muted_users", user)
         await event.edit(f"Unmuted {user} in this chat!")
 
     async def ban_user(self, event):
@@ -118,10 +298,10 @@ class AdminManager:
             chat.id, user,
             ChatBannedRights(until_date=None, view_messages=True)
         ))
+        self.participant_cache.invalidate(event.chat_id, user)
 
         # Add the user to the banned list for this specific chat
-        chat_info = await self._get_chat_data(chat.id)
-        chat_info["banned_users"].add(user)
+        await self._remember(event.chat_id, "banned_users", user)
 
         await event.edit(f"Banned {user} in this chat!")
 
@@ -139,7 +319,7 @@ class AdminManager:
             return await event.edit("Reply to a user to unban them!")
 
         # Check if the user is banned in this specific chat
-        chat_info = await self._get_chat_data(chat.id)
+        chat_info = await self._get_chat_data(event.chat_id)
         if user not in chat_info["banned_users"]:
             return await event.edit("This user is not banned in this chat!")
 
@@ -148,11 +328,193 @@ class AdminManager:
             chat.id, user,
             ChatBannedRights(until_date=None)
         ))
+        self.participant_cache.invalidate(event.chat_id, user)
 
         # Remove the user from the banned list for this specific chat
-        chat_info["banned_users"].discard(user)
+        await self._forget(event.chat_id, "banned_users", user)
         await event.edit(f"Unbanned {user} in this chat!")
 
+    async def kick_user(self, event):
+        """Kicks a user from the specific chat where the command was used."""
+        chat = await event.get_chat()
+
+        if not await self.is_admin(chat, event.sender_id):
+            return await event.edit("You need to be an admin to use this command.")
+
+        if event.reply_to_msg_id:
+            reply = await event.get_reply_message()
+            user = reply.sender_id
+        else:
+            return await event.edit("Reply to a user to kick them!")
+
+        await self.client.kick_participant(chat, user)
+        self.participant_cache.invalidate(event.chat_id, user)
+
+        await event.edit(f"Kicked {user} from this chat!")
+
+    async def _resolve_bulk_targets(self, event, spec):
+        """Turns `last <N>` or a list of ids/usernames into ({label: input_peer}, {label: error})."""
+        parts = spec.replace(",", " ").split()
+        if len(parts) == 2 and parts[0].lower() == "last" and parts[1].isdigit():
+            labels = []
+            async for message in self.client.iter_messages(event.chat_id, limit=int(parts[1]), offset_id=event.id):
+                if message.sender_id and message.sender_id != self.client.me.id and message.sender_id not in labels:
+                    labels.append(message.sender_id)
+        else:
+            labels = [int(part) if part.lstrip("-").isdigit() else part for part in parts]
+
+        resolved, failed = {}, {}
+        batch_size = constants.BULK_RESOLVE_BATCH_SIZE
+        for start in range(0, len(labels), batch_size):
+            chunk = labels[start:start + batch_size]
+            results = await asyncio.gather(
+                *(retry_on_flood_wait(self.client.get_input_entity, label) for label in chunk), return_exceptions=True
+            )
+            for label, result in zip(chunk, results):
+                if isinstance(result, Exception):
+                    failed[str(label)] = type(result).__name__
+                else:
+                    resolved[str(label)] = result
+        return resolved, failed
+
+    async def _apply_bulk_action(self, chat, action, peer):
+        """Performs one moderation action on one user."""
+        if action == "kick":
+            await self.client.kick_participant(chat, peer)
+        elif action == "ban":
+            await self.client(EditBannedRequest(chat, peer, ChatBannedRights(until_date=None, view_messages=True)))
+        elif action == "mute":
+            await self.client(EditBannedRequest(chat, peer, ChatBannedRights(until_date=None, send_messages=True)))
+        else:
+            await self.client(EditBannedRequest(chat, peer, ChatBannedRights(until_date=None)))
+
+    async def bulk_action(self, event):
+        """Handles `.bulk<action> <ids/usernames | last N>` for ban, unban, mute, unmute and kick."""
+        action, spec = event.pattern_match.group(1), event.pattern_match.group(2)
+        past_tense, kind, add = BULK_ACTIONS[action]
+        chat = await event.get_chat()
+
+        if not await self.is_admin(chat, event.sender_id):
+            return await event.edit("You need to be an admin to use this command.")
+
+        await event.edit(f"Resolving users to {action}...")
+        targets, results = await self._resolve_bulk_targets(event, spec)
+        if not targets:
+            return await event.edit(f"No users to {action}.")
+
+        queue = asyncio.Queue()
+        for label, peer in targets.items():
+            queue.put_nowait((label, peer))
+        total = len(targets)
+        done = 0
+        progress = ProgressMessage(event)
+
+        async def worker():
+            nonlocal done
+            while not queue.empty():
+                label, peer = queue.get_nowait()
+                try:
+                    await retry_on_flood_wait(self._apply_bulk_action, chat, action, peer)
+                    user_id = utils.get_peer_id(peer)
+                    self.participant_cache.invalidate(event.chat_id, user_id)
+                    if kind and add:
+                        await self._remember(event.chat_id, kind, user_id)
+                    elif kind:
+                        await self._forget(event.chat_id, kind, user_id)
+                    results[label] = "ok"
+                except Exception as e:
+                    results[label] = type(e).__name__
+                done += 1
+                await progress.update(f"{past_tense} {done}/{total} users...")
+
+        await asyncio.gather(*(worker() for _ in range(min(constants.BULK_MODERATION_CONCURRENCY, total))))
+
+        succeeded = [label for label, result in results.items() if result == "ok"]
+        lines = [f"• `{label}`: {result}" for label, result in results.items()]
+        if len(lines) > BULK_SUMMARY_MAX_LINES:
+            lines = lines[:BULK_SUMMARY_MAX_LINES] + [f"... and {len(lines) - BULK_SUMMARY_MAX_LINES} more"]
+        summary = "\n".join(lines)
+        await progress.edit(f"**{past_tense} {len(succeeded)}/{len(results)} users.**\n{summary}")
+
+    @staticmethod
+    def _is_inactive(user, cutoff, days):
+        """Returns whether a user has not been seen since `cutoff`, judging coarse statuses by `days`."""
+        status = user.status
+        if status is None or isinstance(status, UserStatusEmpty):
+            return True  # "Last seen a long time ago"
+        if isinstance(status, UserStatusOffline):
+            return status.was_online < cutoff
+        if isinstance(status, UserStatusLastMonth):
+            return days <= 7
+        if isinstance(status, UserStatusLastWeek):
+            return days <= 2
+        return False
+
+    async def sweep_participants(self, event):
+        """Handles `.sweep deleted|inactive <days> [dry]`, kicking matches while streaming and re-scanning for members the kicks shifted past."""
+        mode, days, dry_run = event.pattern_match.group(1), event.pattern_match.group(2), bool(event.pattern_match.group(3))
+        if mode == "inactive" and not days:
+            return await event.edit("**Usage:** `.sweep inactive <days> [dry]`")
+        days = int(days or 0)
+        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+        chat = await event.get_chat()
+
+        if not await self.is_admin(chat, event.sender_id):
+            return await event.edit("You need to be an admin to use this command.")
+
+        queue = asyncio.Queue(maxsize=constants.SWEEP_QUEUE_SIZE)
+        rate_limiter = RateLimiter(constants.SWEEP_KICK_INTERVAL)
+        counts = {"scanned": 0, "matched": 0, "kicked": 0, "failed": 0}
+        failed_ids = set()  # Never re-queued by later passes
+        progress = ProgressMessage(event)
+
+        async def report_progress(force=False):
+            text = SWEEP_PROGRESS.format(mode=mode, dry_run=" (dry run)" if dry_run else "", **counts)
+            await (progress.edit(text) if force else progress.update(text))
+
+        async def kicker():
+            while True:
+                peer = await queue.get()
+                try:
+                    await rate_limiter.wait()
+                    await retry_on_flood_wait(self.client.kick_participant, chat, peer)
+                    self.participant_cache.invalidate(event.chat_id, peer.user_id)
+                    counts["kicked"] += 1
+                except Exception as e:
+                    counts["failed"] += 1
+                    failed_ids.add(peer.user_id)
+                    logger.warning(f"Sweep failed to kick {peer.user_id}: {e}")
+                finally:
+                    queue.task_done()
+
+        async def scan():
+            # Returns how many members were queued for a kick in this pass.
+            queued = 0
+            async for user in self.client.iter_participants(chat):
+                counts["scanned"] += 1
+                if user.bot or user.is_self or user.id in failed_ids or isinstance(getattr(user, "participant", None), (ChannelParticipantAdmin, ChannelParticipantCreator)):
+                    continue
+                if user.deleted if mode == "deleted" else (not user.deleted and self._is_inactive(user, cutoff, days)):
+                    counts["matched"] += 1
+                    if not dry_run:
+                        await queue.put(utils.get_input_peer(user))  # Blocks while the kickers catch up
+                        queued += 1
+                await report_progress()
+            await queue.join()
+            return queued
+
+        workers = [] if dry_run else [asyncio.create_task(kicker()) for _ in range(constants.SWEEP_CONCURRENCY)]
+        try:
+            # Kicks shift later members into pages `iter_participants` already
+            # fetched, so scan again until a pass finds nobody left to kick.
+            for _ in range(constants.SWEEP_MAX_PASSES):
+                if not await scan() or dry_run:
+                    break
+        finally:
+            for worker in workers:
+                worker.cancel()
+        await report_progress(force=True)
+
     async def promote_user(self, event):
         """Promotes a user to admin in the specific chat where the command was used."""
         chat = await event.get_chat()
@@ -180,10 +542,10 @@ class AdminManager:
             pin_messages=True
         )
         await self.client(EditAdminRequest(chat.id, user, rights, rank="Admin"))
+        self.participant_cache.invalidate(event.chat_id, user)
 
         # Add the user to the admins list for this specific chat
-        chat_info = await self._get_chat_data(chat.id)
-        chat_info["admins"].add(user)
+        await self._remember(event.chat_id, "admins", user)
 
         await event.edit(f"Promoted {user} to Admin in this chat!")
 
@@ -207,19 +569,29 @@ class AdminManager:
         # Demote the user
         rights = ChatAdminRights()
         await self.client(EditAdminRequest(chat.id, user, rights, rank=""))
+        self.participant_cache.invalidate(event.chat_id, user)
 
         # Remove the user from the admins list for this specific chat
-        chat_info = await self._get_chat_data(chat.id)
-        chat_info["admins"].discard(user)
+        await self._forget(event.chat_id, "admins", user)
 
         await event.edit(f"Demoted {user} to a normal user in this chat!")
 
     async def delete_muted_messages(self, event):
         """Deletes messages sent by muted users in the specific chat."""
-        chat = await event.get_chat()
-        chat_info = await self._get_chat_data(chat.id)
-        if event.sender_id in chat_info["muted_users"]:
-            await event.delete()
+        if (event.chat_id, event.sender_id) not in muted_index:
+            self.messages_filtered += 1
+            return
+        self.deletion_batcher.add(event.chat_id, event.id)
+
+    async def show_moderation_stats(self, event):
+        """Shows how many messages the muted-user filter let through and deleted."""
+        await event.edit(MODERATION_STATS.format(
+            filtered=self.messages_filtered,
+            deleted=self.deletion_batcher.messages_deleted,
+            api_calls=self.deletion_batcher.api_calls,
+            api_calls_saved=self.deletion_batcher.api_calls_saved,
+            muted=len(muted_index)
+        ))
 
     def get_event_handlers(self):
         """Returns event handlers for admin commands."""
@@ -230,5 +602,10 @@ class AdminManager:
             {"callback": self.unban_user, "event": events.NewMessage(pattern=r"\.unban$", outgoing=True)},
             {"callback": self.promote_user, "event": events.NewMessage(pattern=r"\.promote$", outgoing=True)},
             {"callback": self.demote_user, "event": events.NewMessage(pattern=r"\.demote$", outgoing=True)},
+            {"callback": self.kick_user, "event": events.NewMessage(pattern=r"\.kick$", outgoing=True)},
+            {"callback": self.bulk_action, "event": events.NewMessage(pattern=r"\.bulk(ban|unban|mute|unmute|kick) (.+)", outgoing=True)},
+            {"callback": self.sweep_participants, "event": events.NewMessage(pattern=r"\.sweep (deleted|inactive)(?: (\d+))?( dry)?$", outgoing=True)},
+            {"callback": self.show_moderation_stats, "event": events.NewMessage(pattern=r"\.modstats$", outgoing=True)},
             {"callback": self.delete_muted_messages, "event": events.NewMessage()},
+            {"callback": self.handle_participant_update, "event": events.Raw([UpdateChannelParticipant, UpdateChatParticipant, UpdateChatParticipantAdmin])},
             ]
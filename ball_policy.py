@@ -0,0 +1,239 @@
+import random
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import constants
+
+# Tier -> base catch rate used by the catch-probability model (0-255 scale).
+TIER_CATCH_RATES = {
+    "common": 190,
+    "rare": 45,
+}
+
+TIERS = tuple(TIER_CATCH_RATES)
+
+HP_BUCKET_PERCENT = 5  # Decision table resolution for HP percentage
+LEVEL_BUCKET_SIZE = 10  # Decision table resolution for level
+MAX_LEVEL = 100
+
+SIMULATION_REPORT = """
+ 🎲 Ball Policy Simulation ({encounters} encounters)
+---------------------
+{report_lines}
+---------------------
+"""
+
+SIMULATION_REPORT_LINE = "  {name}: {catches} caught, {balls_spent} balls, {catches_per_ball:.3f} catches/ball, {catch_rate:.1f}% catch rate"
+
+
+class BattleState(NamedTuple):
+    """The parsed state of a wild Pokemon during battle."""
+    pokemon: str
+    level: int
+    current_hp: int
+    max_hp: int
+
+    @property
+    def hp_percentage(self) -> int:
+        return round((self.current_hp / self.max_hp) * 100) if self.max_hp > 0 else 100
+
+
+class SimulationResult(NamedTuple):
+    """Outcome of running a policy through the battle simulator."""
+    encounters: int
+    catches: int
+    balls_spent: int
+
+    @property
+    def catches_per_ball(self) -> float:
+        return self.catches / self.balls_spent if self.balls_spent else 0.0
+
+    @property
+    def catch_rate(self) -> float:
+        return (self.catches / self.encounters) * 100 if self.encounters else 0.0
+
+
+def species_tier(pokemon: str) -> str:
+    """Returns the rarity tier of a species based on the configured ball lists."""
+    if pokemon in constants.REPEAT_BALL:
+        return "rare"
+    return "common"
+
+
+def ball_bonus(ball: str, level: int, tier: str) -> float:
+    """Returns the catch-rate multiplier of a ball."""
+    if ball == "Nest":
+        return max(1.0, (41 - level) / 10)
+    if ball == "Repeat":
+        # Repeat Balls only pay off on species we already own, which is what the REPEAT_BALL list holds.
+        return 3.5 if tier == "rare" else 1.0
+    return constants.BALL_MULTIPLIERS.get(ball, 1.0)
+
+
+def catch_probability(ball: str, hp_percentage: float, level: int, tier: str) -> float:
+    """Estimates the chance a single throw catches the Pokemon (Gen III-style formula)."""
+    hp_ratio = min(max(hp_percentage, 1), 100) / 100
+    modified_rate = (3 - 2 * hp_ratio) * TIER_CATCH_RATES[tier] * ball_bonus(ball, level, tier) / 3
+    return min(1.0, modified_rate / 255)
+
+
+class BallInventory:
+    """Tracks remaining balls; a count of `None` means the stock is unknown and treated as unlimited."""
+
+    __slots__ = ('_counts',)
+
+    def __init__(self, counts: Optional[Dict[str, Optional[int]]] = None) -> None:
+        self._counts: Dict[str, Optional[int]] = dict(counts if counts is not None else constants.BALL_INVENTORY)
+
+    def has(self, ball: str) -> bool:
+        count = self._counts.get(ball)
+        return count is None or count > 0
+
+    def known_in_stock(self, ball: str) -> bool:
+        """Returns whether the stock of a ball is known and positive."""
+        count = self._counts.get(ball)
+        return count is not None and count > 0
+
+    def consume(self, ball: str) -> None:
+        count = self._counts.get(ball)
+        if count is not None:
+            self._counts[ball] = max(0, count - 1)
+
+    def set_count(self, ball: str, count: Optional[int]) -> None:
+        self._counts[ball] = count
+
+
+class BallPolicy(ABC):
+    """Decides whether to attack again or which ball to throw. Returns `None` to attack."""
+
+    name = "base"
+
+    @abstractmethod
+    def choose(self, state: BattleState, inventory: Optional[BallInventory] = None) -> Optional[str]:
+        ...
+
+
+class LegacyBallPolicy(BallPolicy):
+    """The original behaviour: throw once HP is at 90% or less, ball picked by list membership."""
+
+    name = "legacy"
+
+    def choose(self, state: BattleState, inventory: Optional[BallInventory] = None) -> Optional[str]:
+        if state.hp_percentage > 90:
+            return None
+        if state.pokemon in constants.REGULAR_BALL:
+            return "Regular"
+        if state.pokemon in constants.REPEAT_BALL:
+            return "Repeat"
+        return None
+
+
+class TableBallPolicy(BallPolicy):
+    """Looks up a precomputed ranking of balls by HP bucket, level bucket and rarity tier.
+
+    Each cell holds the balls whose catch probability clears
+    `BALL_POLICY_MIN_CATCH_PROBABILITY`, ranked by probability per unit cost.
+    An empty cell means attacking again is worth more than any throw. Below
+    `BALL_POLICY_MIN_ATTACK_HP_PERCENT` we never attack and throw the best
+    ball available instead, since another hit risks a knockout. At full HP
+    only Regular Balls, or balls the inventory knows we hold, are thrown on
+    the first turn; otherwise the policy attacks first.
+    """
+
+    name = "table"
+
+    def __init__(self, balls: Iterable[str] = constants.BALL_COSTS) -> None:
+        self._table: Dict[Tuple[int, int, str], Tuple[str, ...]] = self._build_table(tuple(balls))
+
+    @staticmethod
+    def _build_table(balls: Tuple[str, ...]) -> Dict[Tuple[int, int, str], Tuple[str, ...]]:
+        table = {}
+        for hp_bucket in range(100 // HP_BUCKET_PERCENT + 1):
+            hp_percentage = hp_bucket * HP_BUCKET_PERCENT
+            for level_bucket in range(MAX_LEVEL // LEVEL_BUCKET_SIZE + 1):
+                level = max(1, level_bucket * LEVEL_BUCKET_SIZE)
+                for tier in TIERS:
+                    probabilities = {ball: catch_probability(ball, hp_percentage, level, tier) for ball in balls}
+                    worthwhile = [ball for ball in balls if probabilities[ball] >= constants.BALL_POLICY_MIN_CATCH_PROBABILITY]
+                    if worthwhile:
+                        ranked = sorted(worthwhile, key=lambda ball: probabilities[ball] / constants.BALL_COSTS.get(ball, 1), reverse=True)
+                    elif hp_percentage <= constants.BALL_POLICY_MIN_ATTACK_HP_PERCENT:
+                        ranked = sorted(balls, key=lambda ball: probabilities[ball], reverse=True)
+                    else:
+                        ranked = []
+                    table[(hp_bucket, level_bucket, tier)] = tuple(ranked)
+        return table
+
+    def choose(self, state: BattleState, inventory: Optional[BallInventory] = None) -> Optional[str]:
+        hp_bucket = min(max(state.hp_percentage, 0), 100) // HP_BUCKET_PERCENT
+        level_bucket = min(max(state.level, 1), MAX_LEVEL) // LEVEL_BUCKET_SIZE
+        full_hp = state.hp_percentage >= 100
+        for ball in self._table[(hp_bucket, level_bucket, species_tier(state.pokemon))]:
+            if full_hp and ball != "Regular" and (inventory is None or not inventory.known_in_stock(ball)):
+                continue
+            if inventory is None or inventory.has(ball):
+                return ball
+        return None
+
+
+BALL_POLICIES = {
+    LegacyBallPolicy.name: LegacyBallPolicy,
+    TableBallPolicy.name: TableBallPolicy,
+}
+
+
+def get_ball_policy(name: str = constants.BALL_POLICY) -> BallPolicy:
+    """Instantiates a registered ball policy by name."""
+    try:
+        return BALL_POLICIES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown ball policy `{name}`. Choose one of: {', '.join(BALL_POLICIES)}")
+
+
+def simulate(policy: BallPolicy, encounters: int = 10000, seed: Optional[int] = None) -> SimulationResult:
+    """Runs a policy through simulated battles and counts catches and balls spent.
+
+    Species are drawn from the configured ball lists, levels uniformly from
+    5-100, HP from a typical base stat. Each attack removes 15-45% of max HP
+    and knocks the Pokemon out if it reaches zero; every turn it may flee.
+    """
+    rng = random.Random(seed)
+    species = sorted(constants.REGULAR_BALL | constants.REPEAT_BALL)
+    catches = 0
+    balls_spent = 0
+    for _ in range(encounters):
+        pokemon = rng.choice(species)
+        level = rng.randint(5, MAX_LEVEL)
+        max_hp = (2 * 70 * level) // 100 + level + 10
+        current_hp = max_hp
+        tier = species_tier(pokemon)
+        for _ in range(constants.BALL_POLICY_SIM_MAX_TURNS):
+            state = BattleState(pokemon, level, current_hp, max_hp)
+            ball = policy.choose(state)
+            if ball is None:
+                current_hp -= round(max_hp * rng.uniform(0.15, 0.45))
+                if current_hp <= 0:
+                    break
+            else:
+                balls_spent += 1
+                if rng.random() < catch_probability(ball, state.hp_percentage, level, tier):
+                    catches += 1
+                    break
+            if rng.random() < constants.BALL_POLICY_SIM_FLEE_CHANCE:
+                break
+    return SimulationResult(encounters, catches, balls_spent)
+
+
+def generate_simulation_report(encounters: int = 10000, seed: Optional[int] = None) -> str:
+    """Simulates every registered policy on the same encounters and formats a comparison."""
+    report_lines = []
+    for name, policy_class in BALL_POLICIES.items():
+        result = simulate(policy_class(), encounters=encounters, seed=seed)
+        report_lines.append(SIMULATION_REPORT_LINE.format(
+            name=name,
+            catches=result.catches,
+            balls_spent=result.balls_spent,
+            catches_per_ball=result.catches_per_ball,
+            catch_rate=result.catch_rate
+        ))
+    return SIMULATION_REPORT.format(encounters=encounters, report_lines="\n".join(report_lines))
@@ -1,88 +1,217 @@
-from telethon import events
+import asyncio
+import json
+import os
+import re
+from telethon import events, utils
 from telethon.tl.functions.photos import DeletePhotosRequest, UploadProfilePhotoRequest
 from telethon.tl.functions.account import UpdateProfileRequest
 from telethon.tl.functions.users import GetFullUserRequest
 from telethon.errors import StickersetInvalidError
 
-import os
-from constants import TEMP_DOWNLOAD_PATH
+from constants import PROFILE_SNAPSHOT_PATH
+from utility import write_json_atomic
+
+DEFAULT_SNAPSHOT = "default"
+SNAPSHOT_NAME_REGEX = re.compile(r"^[\w-]{1,32}$")
+
+
+class ProfileSnapshotStore:
+    """Named snapshots of my original profile, kept on disk across restarts.
+
+    Each snapshot is a directory holding `profile.json` (names, bio,
+    username, the original photo id and the photos uploaded by clones) and
+    `photo.jpg` with the original photo's bytes. All methods block, so call
+    them through `asyncio.to_thread`.
+    """
+
+    def __init__(self, path=PROFILE_SNAPSHOT_PATH):
+        self._path = path
+
+    def _dir(self, name):
+        return os.path.join(self._path, name)
+
+    def names(self):
+        """Returns the names of all saved snapshots."""
+        if not os.path.isdir(self._path):
+            return []
+        return sorted(name for name in os.listdir(self._path) if os.path.isfile(os.path.join(self._dir(name), "profile.json")))
+
+    def load(self, name):
+        """Returns `(profile, photo_bytes)` for a snapshot, or `(None, None)` if it does not exist."""
+        try:
+            with open(os.path.join(self._dir(name), "profile.json"), "r", encoding="utf-8") as f:
+                profile = json.load(f)
+        except FileNotFoundError:
+            return None, None
+        try:
+            with open(os.path.join(self._dir(name), "photo.jpg"), "rb") as f:
+                photo = f.read()
+        except FileNotFoundError:
+            photo = None
+        return profile, photo
+
+    def save(self, name, profile, photo=None):
+        """Writes a snapshot atomically. `photo` is only written when given."""
+        os.makedirs(self._dir(name), exist_ok=True)
+        if photo is not None:
+            with open(os.path.join(self._dir(name), "photo.jpg.tmp"), "wb") as f:
+                f.write(photo)
+            os.replace(os.path.join(self._dir(name), "photo.jpg.tmp"), os.path.join(self._dir(name), "photo.jpg"))
+        write_json_atomic(os.path.join(self._dir(name), "profile.json"), profile)
+
+    def delete(self, name):
+        for filename in ("profile.json", "photo.jpg"):
+            try:
+                os.remove(os.path.join(self._dir(name), filename))
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(self._dir(name))
+        except OSError:
+            pass
+
+
+def _photo_record(photo):
+    """Serialises a `Photo` so it can be found again on my profile later."""
+    return {"id": photo.id, "access_hash": photo.access_hash}
+
 
 class CloneManager:
     """Handles cloning and reverting user profiles."""
 
     def __init__(self, client):
         self._client = client
-        self.original_profile = {}
+        self._snapshots = ProfileSnapshotStore()
+
+    @staticmethod
+    def _user_of(full):
+        """Returns the `User` described by a `users.UserFull` result."""
+        return next(user for user in full.users if user.id == full.full_user.id)
 
     async def clone(self, event):
-        """Clones a target user's profile (name, bio, username, and profile picture)."""
+        """Clones a target user's profile (name, bio, and profile picture) with `.clone [snapshot]`.
+
+        My original profile is saved under the snapshot name first. Cloning
+        again into an existing snapshot keeps the original it already holds
+        and only records the extra cloned photo.
+        """
         reply = await event.get_reply_message()
         if not reply or not reply.sender:
             await event.edit("Reply to a user's message to clone their profile.")
             return
 
+        name = event.pattern_match.group(1) or DEFAULT_SNAPSHOT
+        if not SNAPSHOT_NAME_REGEX.match(name):
+            return await event.edit("Snapshot names may only contain letters, digits, `_` and `-`.")
         user = reply.sender
 
         try:
-            # Save original profile details
-            my_profile = await self._client(GetFullUserRequest("me"))
-
-            self.original_profile = {
-                "first_name": my_profile.user.first_name or "",
-                "last_name": my_profile.user.last_name or "",
-                "bio": my_profile.about or "",
-                "username": my_profile.user.username or "",
-                "photos": await self._client.get_profile_photos("me")
-            }
-
-            # Get target user's profile details
-            target_profile = await self._client(GetFullUserRequest(user.id))
-            target_user = target_profile.user  # Extract `user` object
-
-            # Update name, bio, and username
-            await self._client(UpdateProfileRequest(
-                first_name=target_user.first_name or "",
-                last_name=target_user.last_name or "",
-                about=target_profile.about or "",
-                username=target_user.username or ""
-            ))
-
-            # Upload latest profile picture if available
-            target_photos = await self._client.get_profile_photos(user)
-            if target_photos:
-                photo_path = await self._client.download_media(target_photos[0])
-                await self._client(UploadProfilePhotoRequest(file=await self._client.upload_file(photo_path)))
-                os.remove(photo_path)  # Clean up temp file
-
-            await event.edit(f"Cloned **{target_user.first_name}**'s profile!")
+            snapshot, _ = await asyncio.to_thread(self._snapshots.load, name)
+
+            async def snapshot_me():
+                # An existing snapshot already holds my original profile, so nothing of mine is fetched
+                if snapshot is not None:
+                    return snapshot, None
+                my_profile, my_photos, my_photo = await asyncio.gather(
+                    self._client(GetFullUserRequest("me")),
+                    self._client.get_profile_photos("me", limit=1),
+                    self._client.download_profile_photo("me", file=bytes)
+                )
+                me = self._user_of(my_profile)
+                return {
+                    "first_name": me.first_name or "",
+                    "last_name": me.last_name or "",
+                    "bio": my_profile.full_user.about or "",
+                    "username": me.username or "",
+                    "photo_id": my_photos[0].id if my_photos else None,
+                    "cloned_photos": []
+                }, my_photo
+
+            # Fetch my original profile (if needed), the target's profile and latest photo at once
+            (snapshot, photo_bytes), target_profile, target_photos = await asyncio.gather(
+                snapshot_me(),
+                self._client(GetFullUserRequest(user.id)),
+                self._client.get_profile_photos(user, limit=1)
+            )
+            await asyncio.to_thread(self._snapshots.save, name, snapshot, photo_bytes)
+
+            target_user = self._user_of(target_profile)
+
+            async def copy_photo():
+                # Transfer the latest profile picture in memory, if available
+                if target_photos:
+                    photo = await self._client.download_media(target_photos[0], file=bytes)
+                    uploaded = await self._client.upload_file(photo, file_name="profile.jpg")
+                    result = await self._client(UploadProfilePhotoRequest(file=uploaded))
+                    snapshot["cloned_photos"].append(_photo_record(result.photo))
+
+            # Update name and bio while the photo transfers. Usernames are unique,
+            # so the target's cannot be copied (UpdateProfileRequest has no such field).
+            await asyncio.gather(
+                self._client(UpdateProfileRequest(
+                    first_name=target_user.first_name or "",
+                    last_name=target_user.last_name or "",
+                    about=target_profile.full_user.about or ""
+                )),
+                copy_photo()
+            )
+            await asyncio.to_thread(self._snapshots.save, name, snapshot)
+
+            await event.edit(f"Cloned **{target_user.first_name}**'s profile! Original saved as `{name}`.")
 
         except Exception as e:
             await event.edit(f"An error occurred: {str(e)}")
 
     async def revert(self, event):
-        """Reverts to the original profile and removes the cloned profile picture."""
-        if not self.original_profile:
-            await event.edit("No original profile saved. Clone first!")
-            return
+        """Restores the profile saved in a snapshot with `.revert [snapshot]` and removes cloned pictures.
+
+        The name/bio update and the photo restore go out as one concurrent
+        batch. Cloned photos are deleted by id through a fresh lookup of my
+        photos, since file references saved at clone time expire, while the
+        original is re-uploaded from the snapshot if it is gone.
+        """
+        name = event.pattern_match.group(1) or DEFAULT_SNAPSHOT
+        if not SNAPSHOT_NAME_REGEX.match(name):
+            return await event.edit("Snapshot names may only contain letters, digits, `_` and `-`.")
+        snapshot, photo_bytes = await asyncio.to_thread(self._snapshots.load, name)
+        if snapshot is None:
+            names = await asyncio.to_thread(self._snapshots.names)
+            if names:
+                return await event.edit(f"No snapshot named `{name}`. Saved snapshots: {', '.join(f'`{n}`' for n in names)}")
+            return await event.edit("No original profile saved. Clone first!")
 
         try:
-            # Restore name, bio, and username
-            await self._client(UpdateProfileRequest(
-                first_name=self.original_profile["first_name"],
-                last_name=self.original_profile["last_name"],
-                about=self.original_profile["bio"],
-                username=self.original_profile["username"]
-            ))
-
-            # Remove cloned profile picture
-            current_photos = await self._client.get_profile_photos("me")
-            if current_photos:
-                await self._client(DeletePhotosRequest([current_photos[0]]))
+            cloned_ids = {record["id"] for record in snapshot["cloned_photos"]}
+
+            async def delete_cloned_photos(my_photos):
+                cloned_photos = [utils.get_input_photo(photo) for photo in my_photos if photo.id in cloned_ids]
+                if cloned_photos:
+                    await self._client(DeletePhotosRequest(cloned_photos))
+
+            async def reupload_original(my_photos):
+                remaining_ids = [photo.id for photo in my_photos if photo.id not in cloned_ids]
+                if snapshot["photo_id"] and photo_bytes and snapshot["photo_id"] not in remaining_ids:
+                    uploaded = await self._client.upload_file(photo_bytes, file_name="profile.jpg")
+                    await self._client(UploadProfilePhotoRequest(file=uploaded))
+
+            async def restore_photos():
+                my_photos = await self._client.get_profile_photos("me")
+                await asyncio.gather(delete_cloned_photos(my_photos), reupload_original(my_photos))
+
+            # Restore name, bio and photos all at once
+            await asyncio.gather(
+                self._client(UpdateProfileRequest(
+                    first_name=snapshot["first_name"],
+                    last_name=snapshot["last_name"],
+                    about=snapshot["bio"]
+                )),
+                restore_photos()
+            )
 
             # Clear stored profile
-            self.original_profile = {}
+            await asyncio.to_thread(self._snapshots.delete, name)
 
-            await event.edit("Profile reverted to original!")
+            await event.edit(f"Profile reverted to snapshot `{name}`!")
 
         except Exception as e:
             await event.edit(f"An error occurred: {str(e)}")
@@ -90,6 +219,6 @@ class CloneManager:
     def get_event_handlers(self):
         """Returns event handlers for clone and revert commands."""
         return [
-            {"callback": self.clone, "event": events.NewMessage(pattern=r"\.clone$", outgoing=True)},
-            {"callback": self.revert, "event": events.NewMessage(pattern=r"\.revert$", outgoing=True)},
+            {"callback": self.clone, "event": events.NewMessage(pattern=r"\.clone(?: (\S+))?$", outgoing=True)},
+            {"callback": self.revert, "event": events.NewMessage(pattern=r"\.revert(?: (\S+))?$", outgoing=True)},
         ]
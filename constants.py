@@ -1,6 +1,5 @@
 import os
 import json
-import random
 
 # Pokémon Categories
 SAFARI = set([])
@@ -49,6 +48,7 @@ POKEMON_TEAM = [
 
 
 TEMP_DOWNLOAD_PATH = "./downloads"
+DATA_PATH = "./data"  # Local state (traces, persisted lists, indexes)
 
 
 # Owner and Bot Information
@@ -60,8 +60,11 @@ PING_COMMAND_REGEX = r'^\.ping$'
 ALIVE_COMMAND_REGEX = r'^\.alive$'
 HELP_COMMAND_REGEX = r'^\.help(?: (.*))?$'
 EVAL_COMMAND_REGEX = r'^\.eval (.+)'
+SANDBOX_EVAL_COMMAND_REGEX = r'^\.seval (.+)'
+PROFILE_COMMAND_REGEX = r'^\.profile (cpu|mem) (.+)'
+SAMPLER_COMMAND_REGEX = r'^\.sampler (on|off|dump|reset)$'
 GUESSER_COMMAND_REGEX = r'^\.guess (on|off|stats)$'
-HUNTER_COMMAND_REGEX = r'^\.hunt (on|off|stats)$'
+HUNTER_COMMAND_REGEX = r'^\.hunt (on|off|stats|sim)$'
 LIST_COMMAND_REGEX = r'^\.list(?:\s+(\w+))?$'  # Now supports `.list <category>`
 
 # AFK Commands
@@ -70,11 +73,96 @@ UNAFK_COMMAND_REGEX = r'^\.unafk$'  # Matches `.unafk`
 
 # Timing and Limits
 
-COOLDOWN = lambda: random.randint(2, 3)  # Random cooldown between 3 and 6 seconds
+# Adaptive cooldown (see cooldown.py)
+COOLDOWN_INITIAL_SECONDS = 2.5  # Starting delay for every action type
+COOLDOWN_MIN_SECONDS = 0.5  # Never act faster than this
+COOLDOWN_MAX_SECONDS = 30.0  # Never back off further than this
+COOLDOWN_JITTER_SECONDS = 0.5  # Random jitter added on top of the delay
+COOLDOWN_TARGET_ERROR_RATE = 0.05  # Keep FloodWait/"wait"/"try again" under 5%
+COOLDOWN_INCREASE_FACTOR = 1.5  # Multiplicative backoff on error
+COOLDOWN_DECREASE_STEP = 0.05  # Additive decrease on success
+COOLDOWN_SMOOTHING = 0.1  # EWMA weight for latency and error rate
+COOLDOWN_LATENCY_FACTOR = 1.0  # The delay never drops below this multiple of the smoothed response latency
 PERIODICALLY_GUESS_SECONDS = 120  # Guess cooldown
 PERIODICALLY_HUNT_SECONDS = 300  # Hunt cooldown (5 minutes)
 HEXA_BOT_ID = 572621020  # ID of the Hexa bot
 
+# Hunt Tracing (see tracing.py)
+TRACE_SAMPLE_RATE = float(os.getenv('HUNT_TRACE_SAMPLE_RATE', '0'))  # Fraction of hunt cycles traced, 0 disables
+TRACE_FILE_PATH = os.path.join(DATA_PATH, 'hunt_trace.json')  # Open in chrome://tracing or ui.perfetto.dev
+TRACE_MAX_BYTES = 5 * 1024 * 1024  # Rotate the trace file past this size
+TRACE_BACKUP_COUNT = 3  # Rotated trace files kept
+TRACE_FLUSH_INTERVAL = 5  # Seconds finished traces are buffered before being written
+
+HEXA_INVENTORY_COMMAND = "/pokemon"  # Hexa command listing owned Pokémon
+RELEASE_CATCH_HISTORY_SIZE = 256  # Catch message ids remembered so edits are counted once
+RELEASE_REPLY_TIMEOUT = 15  # Seconds to wait for each Hexa reply during a release
+RELEASE_SYNC_WINDOW = 30  # Seconds listing page edits are accepted after Hexa's first reply to a sync
+RELEASE_REPLY_BUFFER_SIZE = 50  # Recent Hexa updates kept for replies that beat the waiter
+RELEASE_CONCURRENCY = 1  # Releases in flight at once, shared by all chats
+RELEASE_STATE_PATH = os.path.join(DATA_PATH, 'release_state.json')  # Persisted release list, active chats and inventory
+RELEASE_STATE_FLUSH_INTERVAL = 2  # Seconds state changes are batched before being written
+EDIT_DEDUP_CAPACITY = 512  # Hexa message edits remembered for duplicate suppression
+
+# Ball Policy (see ball_policy.py)
+BALL_POLICY = "table"  # `table` (catch-probability driven) or `legacy` (HP <= 90%, ball by list)
+BALL_COSTS = {"Regular": 1, "Great": 2, "Ultra": 3, "Repeat": 3, "Nest": 3}  # Relative price of each ball
+BALL_MULTIPLIERS = {"Regular": 1.0, "Great": 1.5, "Ultra": 2.0}  # Nest and Repeat depend on level/species
+BALL_INVENTORY = {"Regular": None, "Great": None, "Ultra": None, "Repeat": None, "Nest": None}  # None = unknown/unlimited
+BALL_POLICY_MIN_CATCH_PROBABILITY = 0.3  # Attack again rather than throw below this chance
+BALL_POLICY_MIN_ATTACK_HP_PERCENT = 30  # Never attack below this HP %, throw the best ball instead
+BALL_POLICY_SIM_MAX_TURNS = 20  # Simulator: turns before an encounter is abandoned
+BALL_POLICY_SIM_FLEE_CHANCE = 0.05  # Simulator: chance the Pokemon flees each turn
+
+# Progress messages
+PROGRESS_EDIT_INTERVAL = 3  # Seconds between edits of a long command's progress message
+
+# Moderation
+ADMIN_CACHE_TTL = 300  # Seconds an admin-rights lookup is reused
+MODERATION_DB_PATH = os.path.join(DATA_PATH, 'moderation.db')  # Muted/banned/admin sets
+MODERATION_FLUSH_INTERVAL = 1.0  # Seconds moderation changes are batched before writing
+MUTED_DELETE_WINDOW = 0.05  # Seconds a muted user's messages are coalesced before one delete call
+MUTED_DELETE_BATCH_SIZE = 100  # Max message ids per delete call (Telegram's limit)
+FLOOD_WAIT_RETRIES = 3  # Times an API call is retried after sleeping out a FloodWait
+BULK_MODERATION_CONCURRENCY = 4  # Bulk ban/mute/kick requests in flight at once
+BULK_RESOLVE_BATCH_SIZE = 5  # Users resolved concurrently per batch, kept low since each may be a ResolveUsername call
+SWEEP_CONCURRENCY = 2  # Kicks in flight at once during a sweep
+SWEEP_KICK_INTERVAL = 0.5  # Minimum seconds between the start of two kicks
+SWEEP_QUEUE_SIZE = 200  # Kick targets buffered between the participant stream and the kickers
+SWEEP_MAX_PASSES = 5  # Participant scans per sweep, re-run while the previous one kicked someone
+
+# Purge
+PURGE_CHUNK_SIZE = 100  # Message ids per delete_messages call (Telegram's limit)
+PURGE_CONCURRENCY = 2  # Delete calls in flight at once
+PURGEME_BATCH_INTERVAL = 1.0  # Minimum seconds between `.purgeme` delete batches
+OUTGOING_INDEX_PATH = os.path.join(DATA_PATH, 'outgoing')  # Per-chat indexes of my message ids
+OUTGOING_INDEX_FLUSH_INTERVAL = 5  # Seconds new ids are buffered before being appended to disk
+
+# Kang
+STICKER_SIZE = 512  # Longest side of a sticker in px, as required by @Stickers
+STICKER_WEBP_QUALITY = 95
+STICKER_PACK_LIMIT = 120  # Stickers per pack before kangs roll over to `<pack>_2`, `<pack>_3`...
+STICKER_PACK_CACHE_PATH = os.path.join(DATA_PATH, 'sticker_packs.json')  # Known packs and their sticker counts
+STICKERS_BOT_TIMEOUT = 30  # Seconds to wait for each @Stickers reply
+KANGSET_CONCURRENCY = 4  # Stickers downloaded/converted at once by `.kangset`
+KANGSET_PREFETCH = 8  # Prepared stickers buffered ahead of the @Stickers session
+KANGSET_PROGRESS_PATH = os.path.join(DATA_PATH, 'kangset_progress.json')  # Resume points of interrupted `.kangset` runs
+
+# Sandboxed eval
+SANDBOX_TIMEOUT = 10  # Wall-clock seconds before a `.seval` worker is killed
+SANDBOX_MEMORY_LIMIT = 256 * 1024 * 1024  # Address space of a `.seval` worker in bytes
+SANDBOX_MAX_OUTPUT = 1024 * 1024  # Bytes of `.seval` output kept
+
+# Profiling
+PROFILE_TOP_N = 30  # Functions or allocation sites listed by `.profile`
+PROFILE_TRACEMALLOC_FRAMES = 1  # Frames stored per allocation by `.profile mem`
+SAMPLER_INTERVAL = 0.01  # Seconds between stack samples of the event loop thread
+SAMPLER_MAX_STACKS = 5000  # Unique collapsed stacks kept before new ones go to `[other]`
+SAMPLER_MAX_DEPTH = 64  # Frames kept per sample, from the innermost outwards
+
+# Clone
+PROFILE_SNAPSHOT_PATH = os.path.join(DATA_PATH, 'profiles')  # Named snapshots of my original profile
+
 # Auto-Battle Constants
 HUNT_DAILY_LIMIT_REACHED = "Daily hunt limit reached. Auto-battle stopped."
 SHINY_FOUND = "Shiny Pokémon found! Auto-battle stopped for {0}."
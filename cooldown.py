@@ -0,0 +1,137 @@
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+import constants
+
+# Substrings in Hexa's replies that mean we acted too early.
+HEXA_RETRY_MARKERS = ("wait", "try again")
+
+COOLDOWN_REPORT_LINE = "  ⏳ {action}: {delay:.2f}s (latency: {latency}, error rate: {error_rate:.2f}%, errors: {errors}/{samples})"
+
+
+class ActionCooldown:
+    """Holds the adaptive delay and observed statistics for a single action type."""
+
+    __slots__ = ('delay', 'latency', 'error_rate', 'samples', 'errors', 'pending_since')
+
+    def __init__(self, initial_delay: float) -> None:
+        self.delay: float = initial_delay
+        self.latency: Optional[float] = None
+        self.error_rate: float = 0.0
+        self.samples: int = 0
+        self.errors: int = 0
+        self.pending_since: Optional[float] = None
+
+
+class AdaptiveCooldown:
+    """Tunes per-action cooldowns from Hexa's response latency and error rate.
+
+    Every error (FloodWait, "wait", "try again") multiplies the delay by
+    `COOLDOWN_INCREASE_FACTOR`; every success while the smoothed error rate is
+    below `COOLDOWN_TARGET_ERROR_RATE` shaves `COOLDOWN_DECREASE_STEP` off it,
+    so the delay settles just above the point where errors start to appear.
+    The delay never drops below `COOLDOWN_LATENCY_FACTOR` times the smoothed
+    response latency, so a slow bot slows us down before it starts erroring.
+    """
+
+    __slots__ = ('_actions',)
+
+    def __init__(self) -> None:
+        self._actions: Dict[str, ActionCooldown] = {}
+
+    def _get(self, action: str) -> ActionCooldown:
+        """Returns the state for an action, creating it on first use."""
+        state = self._actions.get(action)
+        if state is None:
+            state = self._actions[action] = ActionCooldown(constants.COOLDOWN_INITIAL_SECONDS)
+        return state
+
+    @staticmethod
+    def _floor(state: ActionCooldown) -> float:
+        """Returns the lowest delay allowed for an action given its measured latency."""
+        if state.latency is None:
+            return constants.COOLDOWN_MIN_SECONDS
+        return min(constants.COOLDOWN_MAX_SECONDS, max(constants.COOLDOWN_MIN_SECONDS, state.latency * constants.COOLDOWN_LATENCY_FACTOR))
+
+    def delay(self, action: str) -> float:
+        """Returns the current delay for an action with a small random jitter."""
+        return self._get(action).delay + random.uniform(0, constants.COOLDOWN_JITTER_SECONDS)
+
+    async def wait(self, action: str) -> None:
+        """Sleeps for the current delay of an action."""
+        await asyncio.sleep(self.delay(action))
+
+    def mark_sent(self, action: str) -> None:
+        """Marks that a request for an action was sent and a response is expected."""
+        self._get(action).pending_since = time.monotonic()
+
+    def mark_response(self, action: str, text: str = '') -> None:
+        """Records the response to a previously sent request, if one is pending."""
+        state = self._get(action)
+        if state.pending_since is None:
+            return
+        self.record_latency(action, time.monotonic() - state.pending_since)
+        state.pending_since = None
+        if self.is_retry_response(text):
+            self.record_error(action)
+        else:
+            self.record_success(action)
+
+    def record_latency(self, action: str, seconds: float) -> None:
+        """Folds a latency sample into the smoothed latency of an action."""
+        state = self._get(action)
+        if state.latency is None:
+            state.latency = seconds
+        else:
+            alpha = constants.COOLDOWN_SMOOTHING
+            state.latency = (1 - alpha) * state.latency + alpha * seconds
+        state.delay = max(state.delay, self._floor(state))
+
+    def record_success(self, action: str) -> None:
+        """Records a successful action and lowers the delay if errors are under target."""
+        state = self._get(action)
+        state.samples += 1
+        state.error_rate *= 1 - constants.COOLDOWN_SMOOTHING
+        if state.error_rate < constants.COOLDOWN_TARGET_ERROR_RATE:
+            state.delay = max(self._floor(state), state.delay - constants.COOLDOWN_DECREASE_STEP)
+
+    def record_error(self, action: str, retry_after: Optional[float] = None) -> None:
+        """Records a rate-limit error and backs the delay off."""
+        state = self._get(action)
+        state.samples += 1
+        state.errors += 1
+        alpha = constants.COOLDOWN_SMOOTHING
+        state.error_rate = (1 - alpha) * state.error_rate + alpha
+        backoff = state.delay * constants.COOLDOWN_INCREASE_FACTOR
+        if retry_after:
+            backoff = max(backoff, retry_after)
+        state.delay = min(constants.COOLDOWN_MAX_SECONDS, backoff)
+        logger.debug(f'[{self.__class__.__name__}] `{action}` rate limited, cooldown raised to {state.delay:.2f}s')
+
+    @staticmethod
+    def is_retry_response(text: str) -> bool:
+        """Returns whether a Hexa reply asks us to slow down."""
+        text = text.lower()
+        return any(marker in text for marker in HEXA_RETRY_MARKERS)
+
+    def generate_report_lines(self) -> List[str]:
+        """Returns one report line per tracked action."""
+        lines = []
+        for action, state in sorted(self._actions.items()):
+            lines.append(COOLDOWN_REPORT_LINE.format(
+                action=action,
+                delay=state.delay,
+                latency=f'{state.latency:.2f}s' if state.latency is not None else 'N/A',
+                error_rate=state.error_rate * 100,
+                errors=state.errors,
+                samples=state.samples
+            ))
+        return lines
+
+
+# Shared across engines and reconnects so learned delays are kept.
+cooldown_controller = AdaptiveCooldown()
@@ -1,7 +1,12 @@
 import asyncio
+import cProfile
 import html
+import io
+import os
+import pstats
 import sys
 import traceback
+import tracemalloc
 from typing import List, Dict, Any, Callable
 
 import aiofiles
@@ -12,6 +17,8 @@ from telethon import events
 import constants
 from utility import delete_if_exists
 
+SANDBOX_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox.py')
+
 class ExpressionEvaluator:
     """
     A class to encapsulate the code evaluation functionality, 
@@ -80,6 +87,154 @@ class ExpressionEvaluator:
         task = asyncio.create_task(meval(expression, globals(), **locals(), **namespaces))
         return await task
 
+    async def _evaluate_in_sandbox(self, expression: str) -> str:
+        """
+        Evaluates a Python code expression in a separate, resource-limited process.
+
+        The worker gets no `client` or `event`, an empty environment (so no
+        session secrets), `SANDBOX_MEMORY_LIMIT` bytes of address space and
+        is killed after `SANDBOX_TIMEOUT` seconds, so it can never stall the
+        event loop.
+
+        Args:
+            expression: The Python code expression to evaluate.
+
+        Returns:
+            str: Whatever the code printed, followed by its result or traceback.
+        """
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, '-I', SANDBOX_SCRIPT,
+            str(constants.SANDBOX_MEMORY_LIMIT), str(constants.SANDBOX_TIMEOUT + 1),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env={'PATH': os.environ.get('PATH', '')}
+        )
+        async def kill_and_reap():
+            # `wait()` only returns once stdout is closed, and a full pipe stays paused, so drain it first.
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            while await process.stdout.read(65536):
+                pass
+            await process.wait()
+
+        async def read_capped_output():
+            # Never buffer more than the cap: stop reading and kill the worker once it is exceeded.
+            try:
+                process.stdin.write(expression.encode('utf-8'))
+                await process.stdin.drain()
+                process.stdin.close()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            chunks, size = [], 0
+            while size <= constants.SANDBOX_MAX_OUTPUT:
+                chunk = await process.stdout.read(min(65536, constants.SANDBOX_MAX_OUTPUT + 1 - size))
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+            truncated = size > constants.SANDBOX_MAX_OUTPUT
+            if truncated:
+                await kill_and_reap()
+            else:
+                await process.wait()
+            return b''.join(chunks)[:constants.SANDBOX_MAX_OUTPUT], truncated
+
+        try:
+            output, truncated = await asyncio.wait_for(read_capped_output(), timeout=constants.SANDBOX_TIMEOUT)
+        except asyncio.TimeoutError:
+            await kill_and_reap()
+            return f'Timed out after {constants.SANDBOX_TIMEOUT}s.'
+
+        output = output.decode('utf-8', errors='replace')
+        if truncated:
+            output += f'\n[Output truncated at {constants.SANDBOX_MAX_OUTPUT} bytes, worker killed.]'
+        elif process.returncode < 0:
+            output += f'\nKilled by signal {-process.returncode} (memory or CPU limit reached?).'
+        return output or 'No output.'
+
+    async def _evaluate_or_format_exception(self, expression: str, namespaces: dict) -> Any:
+        """
+        Evaluates a Python code expression, returning the formatted traceback if it raises.
+
+        Args:
+            expression: The Python code expression to evaluate.
+            namespaces: Dictionary containing namespaces for evaluation.
+
+        Returns:
+            Any: The result of the evaluated expression or the error text.
+        """
+        try:
+            return await self._evaluate_expression(expression, namespaces)
+        except Exception as e:
+            etype, value, tb = sys.exc_info()
+            if not (etype and value and tb):
+                _formatted_exc = traceback.format_exc()
+            else:
+                _formatted_exc = traceback.format_exception(etype, value, tb)
+
+            formatted_exc = (
+                ''.join(_formatted_exc)
+                if isinstance(_formatted_exc, list)
+                else _formatted_exc
+            )
+            return f'{e}\n\n{formatted_exc}'
+
+    async def _profile_cpu(self, expression: str, namespaces: dict) -> str:
+        """
+        Evaluates an expression under cProfile and reports the top functions by cumulative time.
+
+        The profiler sees everything that runs on the event loop while the
+        expression is awaited, including other handlers.
+
+        Args:
+            expression: The Python code expression to evaluate.
+            namespaces: Dictionary containing namespaces for evaluation.
+
+        Returns:
+            str: The result followed by the pstats report.
+        """
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            output = await self._evaluate_or_format_exception(expression, namespaces)
+        finally:
+            profiler.disable()
+
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(constants.PROFILE_TOP_N)
+        return f'Result: {output}\n\n{stream.getvalue()}'
+
+    async def _profile_memory(self, expression: str, namespaces: dict) -> str:
+        """
+        Evaluates an expression under tracemalloc and reports the top allocation sites.
+
+        Args:
+            expression: The Python code expression to evaluate.
+            namespaces: Dictionary containing namespaces for evaluation.
+
+        Returns:
+            str: The result, peak traced memory and the allocation sites that grew most.
+        """
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start(constants.PROFILE_TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        try:
+            before = tracemalloc.take_snapshot()
+            output = await self._evaluate_or_format_exception(expression, namespaces)
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+
+        lines = [f'Result: {output}', '', f'Peak traced memory: {peak / 1024:.1f} KiB', '']
+        lines.extend(str(stat) for stat in after.compare_to(before, 'lineno')[:constants.PROFILE_TOP_N])
+        return '\n'.join(lines)
+
     async def _handle_output(self, event, output: Any, expression: str) -> None:
         """
         Handles the output of the evaluated expression by sending it as a document.
@@ -124,27 +279,71 @@ class ExpressionEvaluator:
         namespaces = await self._get_namespaces(event)
         expression = self._cleanup_code(message_parts[1])
 
-        try:
-            output = await self._evaluate_expression(expression, namespaces)
-        except Exception as e:
-            etype, value, tb = sys.exc_info()
-            if not (etype and value and tb):
-                _formatted_exc = traceback.format_exc()
-            else:
-                _formatted_exc = traceback.format_exception(etype, value, tb)
+        output = await self._evaluate_or_format_exception(expression, namespaces)
+        await self._handle_output(event, output, expression)
 
-            formatted_exc = (
-                ''.join(_formatted_exc)
-                if isinstance(_formatted_exc, list)
-                else _formatted_exc
-            )
-            output = f'{e}\n\n{formatted_exc}'
+    async def sandbox_eval_command(self, event) -> None:
+        """
+        Evaluates a pure-computation Python expression in a sandboxed worker process.
+
+        Unlike `.eval`, the code cannot touch `client` or the bot's state, but
+        CPU-heavy or blocking code runs without freezing the event loop.
 
+        Args:
+            event: The event object (e.g., message event) containing the
+                   command and expression to evaluate.
+        """
+        message_parts = event.raw_text.split(maxsplit=1)
+        if len(message_parts) < 2:
+            await event.reply('No expression provided.')
+            return
+
+        expression = self._cleanup_code(message_parts[1])
+        output = await self._evaluate_in_sandbox(expression)
         await self._handle_output(event, output, expression)
 
+    async def profile_command(self, event) -> None:
+        """
+        Evaluates a Python expression under cProfile (`cpu`) or tracemalloc (`mem`).
+
+        The top `PROFILE_TOP_N` functions or allocation sites are sent back
+        as an in-memory text document.
+
+        Args:
+            event: The event object (e.g., message event) containing the
+                   command, mode and expression to evaluate.
+        """
+        message_parts = event.raw_text.split(maxsplit=2)
+        if len(message_parts) < 3:
+            await event.reply('Usage: `.profile (cpu|mem) <expression>`')
+            return
+
+        mode = event.pattern_match.group(1)
+        namespaces = await self._get_namespaces(event)
+        expression = self._cleanup_code(message_parts[2])
+
+        try:
+            if mode == 'cpu':
+                report = await self._profile_cpu(expression, namespaces)
+            else:
+                report = await self._profile_memory(expression, namespaces)
+        except ValueError as e:
+            # cProfile refuses to start while another profiler is active
+            await event.reply(f'Could not start the profiler: {e}')
+            return
+
+        document = io.BytesIO(report.encode('utf-8'))
+        document.name = f'profile_{mode}.txt'
+        await event.reply(
+            file=document,
+            message=f'<code>{html.escape(expression)}</code>'
+        )
+
     @property
     def event_handlers(self) -> List[Dict[str, Callable | events.NewMessage]]:
         """Returns a list of event handlers."""
         return [
-            {'callback': self.eval_command, 'event': events.NewMessage(pattern=constants.EVAL_COMMAND_REGEX, outgoing=True)}
+            {'callback': self.eval_command, 'event': events.NewMessage(pattern=constants.EVAL_COMMAND_REGEX, outgoing=True)},
+            {'callback': self.sandbox_eval_command, 'event': events.NewMessage(pattern=constants.SANDBOX_EVAL_COMMAND_REGEX, outgoing=True)},
+            {'callback': self.profile_command, 'event': events.NewMessage(pattern=constants.PROFILE_COMMAND_REGEX, outgoing=True)}
         ]
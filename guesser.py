@@ -4,9 +4,11 @@ from typing import List, Dict, Callable, Optional
 
 from loguru import logger
 from telethon import events
+from telethon.errors import FloodWaitError
 from telethon.tl.types import PhotoStrippedSize
 
 import constants
+from cooldown import cooldown_controller
 from utility import delete_if_exists
 
 
@@ -156,9 +158,15 @@ class PokemonIdentificationEngine:
   
     async def _transmit_guess_command(self) -> None:
         """Transmits the guess command (/guess) to the designated chat."""
-        await asyncio.sleep(constants.COOLDOWN())
+        await cooldown_controller.wait('guess')
         if self.automation_orchestrator.is_automation_active:
-            await self._client.send_message(entity=constants.CHAT_ID, message='/guess')
+            try:
+                await self._client.send_message(entity=constants.CHAT_ID, message='/guess')
+            except FloodWaitError as e:
+                cooldown_controller.record_error('guess', retry_after=e.seconds)
+                logger.warning(f'[{self.__class__.__name__}] FloodWait of {e.seconds}s when sending /guess command.')
+                return
+            cooldown_controller.mark_sent('guess')
             self.activity_monitor.record_activity(message_sent=True)
 
   
@@ -224,6 +232,7 @@ class PokemonIdentificationEngine:
             return
 
         self.activity_monitor.record_activity(response_received=True)
+        cooldown_controller.mark_response('guess')
 
         stripped_size = self._get_stripped_size(event.message.photo)
         if not stripped_size:
@@ -236,7 +245,7 @@ class PokemonIdentificationEngine:
               break
 
         if pokemon_name is not None:
-            await asyncio.sleep(constants.COOLDOWN())
+            await cooldown_controller.wait('guess')
             await event.reply(pokemon_name)
             self.activity_monitor.record_activity(successful_identification=True)
         else:
@@ -2,15 +2,19 @@ from __future__ import annotations
 
 import asyncio
 import regex
+from collections import OrderedDict
 from typing import TYPE_CHECKING, List, Dict, Callable, Optional, Tuple
 from enum import Enum, auto
 import time
 
 from loguru import logger
 from telethon import events
-from telethon.errors import DataInvalidError, MessageIdInvalidError
+from telethon.errors import DataInvalidError, FloodWaitError, MessageIdInvalidError
 
 import constants
+from ball_policy import BallInventory, BallPolicy, BattleState, generate_simulation_report, get_ball_policy
+from cooldown import AdaptiveCooldown, cooldown_controller
+from tracing import HuntTracer
 
 if TYPE_CHECKING:
     from telethon.tl import BotCallbackAnswer, Message
@@ -40,6 +44,7 @@ METRIC_NAMES = {
     "response_skip_rate": " пропускать Response skip rate",
     "items_found": "📦 Items found",
     "pokeball_usage": "⚽ Pokeball Usage",
+    "duplicate_updates_suppressed": "♻️ Duplicate updates suppressed",
 }
 
 POKEBALL_BUTTON_TEXT_MAP = {
@@ -102,6 +107,7 @@ class ActivityType(Enum):
     POKE_DOLLARS_ACCRUED = auto()
     ITEM_FOUND = auto()
     POKEBALL_USED = auto()
+    DUPLICATE_UPDATE_SUPPRESSED = auto()
 
 
 class ActivityMonitor:
@@ -118,7 +124,8 @@ class ActivityMonitor:
         '_switched_pokemon',
         '_poke_dollars_accrued',
         '_items_found',
-        '_pokeball_usage'
+        '_pokeball_usage',
+        '_duplicate_updates_suppressed'
     )
 
     def __init__(self):
@@ -133,6 +140,7 @@ class ActivityMonitor:
         self._poke_dollars_accrued: int = 0
         self._items_found: list = []
         self._pokeball_usage: Dict[str, int] = {}
+        self._duplicate_updates_suppressed: int = 0
 
     def record_activity(self, activity_type: ActivityType, value=None) -> None:
         """Records activity events, incrementing counters and handling values."""
@@ -161,6 +169,8 @@ class ActivityMonitor:
                 if not isinstance(value, str):
                     raise ValueError(f"Value for {activity_type.name} must be a string (item name).")
                 self._items_found.append(value)
+            elif activity_type == ActivityType.DUPLICATE_UPDATE_SUPPRESSED:
+                self._duplicate_updates_suppressed += 1
             elif activity_type == ActivityType.POKEBALL_USED:
                 if not isinstance(value, str):
                     raise ValueError(f"Value for {activity_type.name} must be a string (ball name).")
@@ -190,6 +200,7 @@ class ActivityMonitor:
         self._poke_dollars_accrued = 0
         self._items_found = []
         self._pokeball_usage = {}
+        self._duplicate_updates_suppressed = 0
         logger.debug("Activity metrics reset.")
 
 
@@ -221,6 +232,9 @@ class ActivityMonitor:
         report_lines.append(
             TELEMETRY_REPORT_LINE.format(metric_name=METRIC_NAMES["pokemon_switched"], value=self._switched_pokemon)
         )
+        report_lines.append(
+            TELEMETRY_REPORT_LINE.format(metric_name=METRIC_NAMES["duplicate_updates_suppressed"], value=self._duplicate_updates_suppressed)
+        )
 
         if self._responses_received > 0:
             encounter_rate = (self._successful_encounter / self._responses_received) * 100
@@ -286,13 +300,55 @@ class ActivityMonitor:
 
 
 
+class EditDeduplicator:
+    """Drops repeated deliveries of the same Hexa message edit.
+
+    Remembers the content hash (text plus button labels) of the last edit
+    seen for each message id in a bounded LRU. An edit whose content matches
+    the last one seen for its message is a repeat, whether it is the same
+    update delivered again or a new edit with unchanged text. The edit date is
+    not part of the key: it only has one-second resolution, so two genuine
+    edits in the same second would otherwise collide.
+    """
+
+    __slots__ = ('_capacity', '_seen')
+
+    def __init__(self, capacity: int = constants.EDIT_DEDUP_CAPACITY) -> None:
+        self._capacity = capacity
+        self._seen: OrderedDict[int, int] = OrderedDict()
+
+    @staticmethod
+    def _content_hash(message) -> int:
+        buttons = tuple(
+            button.text for row in (message.buttons or ()) for button in row
+        )
+        return hash((message.raw_text, buttons))
+
+    def is_duplicate(self, message) -> bool:
+        """Returns whether the edit repeats the last one seen, remembering it otherwise."""
+        content_hash = self._content_hash(message)
+        if self._seen.get(message.id) == content_hash:
+            self._seen.move_to_end(message.id)
+            return True
+        self._seen[message.id] = content_hash
+        self._seen.move_to_end(message.id)
+        if len(self._seen) > self._capacity:
+            self._seen.popitem(last=False)
+        return False
+
+
 class PokemonHuntingEngine:
     """Engine for Pokemon hunting automation."""
 
     __slots__ = (
         '_client',
         'automation_orchestrator',
-        'activity_monitor'
+        'activity_monitor',
+        'cooldown_controller',
+        'tracer',
+        'ball_policy',
+        'ball_inventory',
+        'edit_deduplicator'
     )
 
     def __init__(self, client) -> None:
@@ -300,6 +356,11 @@ class PokemonHuntingEngine:
         self._client = client
         self.automation_orchestrator = AutomationOrchestrator()
         self.activity_monitor = ActivityMonitor()
+        self.cooldown_controller: AdaptiveCooldown = cooldown_controller
+        self.tracer = HuntTracer()
+        self.ball_policy: BallPolicy = get_ball_policy()
+        self.ball_inventory = BallInventory()
+        self.edit_deduplicator = EditDeduplicator()
 
 
     def start(self) -> None:
@@ -345,8 +406,16 @@ class PokemonHuntingEngine:
         count = 0
         while count <= 5:
             count += 1
-            await asyncio.sleep(constants.COOLDOWN())
-            response = await event.click(i=i, j=j, text=text, data=None)
+            await self.cooldown_controller.wait('click')
+            clicked_at = time.monotonic()
+            try:
+                response = await event.click(i=i, j=j, text=text, data=None)
+            except FloodWaitError as e:
+                self.cooldown_controller.record_error('click', retry_after=e.seconds)
+                logger.warning(f'FloodWait of {e.seconds}s while clicking button.')
+                await asyncio.sleep(e.seconds)
+                continue
+            self.cooldown_controller.record_latency('click', time.monotonic() - clicked_at)
             if not response:
                await asyncio.sleep(1)
                continue
@@ -356,11 +425,10 @@ class PokemonHuntingEngine:
                    substring in response_text for substring
                    in ["none", "fled", "caught", "in battle", "catching", "failed", "choose", "go, "]
                ):
+               self.cooldown_controller.record_success('click')
                break
-            elif any(
-                   substring in response_text for substring
-                   in ["wait", "try again"]
-               ):
+            elif self.cooldown_controller.is_retry_response(response_text):
+               self.cooldown_controller.record_error('click')
                await asyncio.sleep(1)
             else:
                logger.debug(response)
@@ -369,10 +437,22 @@ class PokemonHuntingEngine:
     async def _transmit_hunt_command(self) -> None:
         """Transmits the /hunt command, handling potential connection issues."""
         try:
-            await asyncio.sleep(constants.COOLDOWN())
+            self.tracer.start_span('cooldown')
+            try:
+                await self.cooldown_controller.wait('hunt')
+            finally:
+                # The cooldown closes out the previous cycle, before the next trace starts
+                self.tracer.end_span('cooldown')
+                self.tracer.end_trace()
             if self.automation_orchestrator.is_automation_active:
+                self.tracer.start_trace()
+                self.tracer.start_span('await_encounter')
                 await self._client.send_message(entity=constants.HEXA_BOT_ID, message='/hunt')
+                self.cooldown_controller.mark_sent('hunt')
                 self.activity_monitor.record_activity(activity_type=ActivityType.MESSAGE_SENT)
+        except FloodWaitError as e:
+            self.cooldown_controller.record_error('hunt', retry_after=e.seconds)
+            logger.warning(f"FloodWait of {e.seconds}s when sending /hunt command.")
         except ConnectionError as ce:
             logger.warning(f"Connection error when sending /hunt command: {ce}")
         except Exception as e:
@@ -399,7 +479,7 @@ class PokemonHuntingEngine:
         """Handles automation control commands (on/off/stats)."""
         command_parts = event.raw_text.split()
         if len(command_parts) != 2:
-            await event.respond("Invalid command format. Use: `/automhunt on|off|stats`")
+            await event.respond("Invalid command format. Use: `.hunt on|off|stats|sim`")
             return
 
         action = command_parts[1].lower()
@@ -414,9 +494,14 @@ class PokemonHuntingEngine:
             await event.edit(message)
         elif action == 'stats':
             telemetry_report = self.activity_monitor.generate_telemetry_report(self.automation_orchestrator.start_time)
-            await event.edit(telemetry_report)
+            cooldown_report = "\n".join(self.cooldown_controller.generate_report_lines()) or "  None"
+            await event.edit(f"{telemetry_report}\n⏳ Cooldowns:\n{cooldown_report}")
+        elif action == 'sim':
+            await event.edit('Simulating ball policies...')
+            simulation_report = await asyncio.to_thread(generate_simulation_report)
+            await event.edit(f"{simulation_report}Active policy: {self.ball_policy.name}")
         else:
-            await event.respond("Invalid action. Use: `.hunt on|off|stats`")
+            await event.respond("Invalid action. Use: `.hunt on|off|stats|sim`")
 
 
     async def poki_list(self, event: events.NewMessage.Event) -> None:
@@ -425,6 +510,12 @@ class PokemonHuntingEngine:
         await event.edit(f"Pokèmon List: {pokemon}")
 
 
+    async def observe_hexa_response(self, event: events.NewMessage.Event) -> None:
+        """Feeds Hexa's reply to the last /hunt into the adaptive cooldown."""
+        self.cooldown_controller.mark_response('hunt', event.raw_text)
+        self.tracer.end_span('await_encounter')
+
+
     async def handle_daily_quota_exceeded(self, event: events.NewMessage.Event) -> None:
         """Handles daily quota exceeded messages, deactivating automation."""
         substring = 'daily hunt limit reached'
@@ -435,6 +526,7 @@ class PokemonHuntingEngine:
             message = f"<a href='tg://user?id={self._client.me.id}'>{self._client.me.first_name}</a> {warning}\n{telemetry_report}"
             await self._client.send_message(entity=constants.CHAT_ID, message=message)
             self.automation_orchestrator.deactivate_automation(self.activity_monitor)
+            self.tracer.end_trace(outcome='daily_limit')
             logger.warning(f"[{self.__class__.__name__}] @{self._client.me.username}'s {warning}")
 
 
@@ -452,24 +544,28 @@ class PokemonHuntingEngine:
             message = f"<a href='tg://user?id={self._client.me.id}'>{self._client.me.first_name}</a> {warning}\n{telemetry_report}"
             await self._client.send_message(entity=constants.CHAT_ID, message=message)
             self.automation_orchestrator.deactivate_automation(self.activity_monitor)
+            self.tracer.end_trace(outcome='shiny')
             logger.warning(f"[{self.__class__.__name__}] @{self._client.me.username}'s {warning}")
 
         elif "A wild" in event.raw_text:
             self.activity_monitor.record_activity(activity_type=ActivityType.RESPONSE_RECEIVED)
+            self.tracer.start_span('decision')
             name_match = regex.search(r"A wild (.+?) \(", event.raw_text)
             pok_name = name_match.group(1).strip()
             logger.debug(f"Wild Pokemon encountered: {pok_name}")
             for ball_name in POKEBALL_BUTTON_TEXT_MAP:
                 if pok_name in getattr(constants, f'{ball_name.upper()}_BALL', []):
-                    await asyncio.sleep(constants.COOLDOWN())
+                    self.tracer.end_span('decision', pokemon=pok_name, action='battle')
                     try:
-                        await self._click_button(event=event, i=0, j=0)
+                        with self.tracer.span('engage', pokemon=pok_name):
+                            await self._click_button(event=event, i=0, j=0)
                         break
                     except (DataInvalidError, MessageIdInvalidError) as e:
                         logger.warning(f'Failed to click button for {pok_name}: {e}')
                     except Exception as e:
                         logger.exception(f"Unexpected error clicking button for {pok_name}: {e}")
             else:
+                self.tracer.end_span('decision', pokemon=pok_name, action='skip')
                 self.activity_monitor.record_activity(activity_type=ActivityType.SKIPPED_ENCOUNTER)
                 await self._transmit_hunt_command()
 
@@ -488,18 +584,20 @@ class PokemonHuntingEngine:
                 wild_max_hp = int(wild_pokemon_hp_match.group(2))
                 if wild_max_hp <= 90:
                     logger.debug(f"{pok_name} is low level (HP: {wild_max_hp}), using Poke Balls directly.")
-                    await asyncio.sleep(constants.COOLDOWN())
+                    await self.cooldown_controller.wait('click')
                     try:
-                        await event.click(text="Poke Balls")
+                        with self.tracer.span('battle_start', pokemon=pok_name, action='poke_balls'):
+                            await event.click(text="Poke Balls")
                         logger.info('clicked on btn poke balls')
                     except (DataInvalidError, MessageIdInvalidError) as e:
                         logger.warning(f'Failed to click "Poke Balls" for {pok_name}: {e}')
                     except Exception as e:
                         logger.exception(f'Unexpected error clicking "Poke Balls" for {pok_name}: {e}')
                 else:
-                    await asyncio.sleep(2)
+                    await self.cooldown_controller.wait('click')
                     try:
-                        await event.click(0, 0)
+                        with self.tracer.span('battle_start', pokemon=pok_name, action='attack'):
+                            await event.click(0, 0)
                     except (DataInvalidError, MessageIdInvalidError) as e:
                         logger.warning(f'Failed to click first option for high-level {pok_name}: {e}')
                     except Exception as e:
@@ -518,8 +616,14 @@ class PokemonHuntingEngine:
                     wild_max_hp = int(wild_pokemon_hp_match.group(2))
                     wild_current_hp = int(wild_pokemon_hp_match.group(1))
                     wild_health_percentage = (wild_current_hp / wild_max_hp) * 100
+                    level_match = regex.search(r"Lv\. (\d+)", event.raw_text)
+                    wild_level = int(level_match.group(1)) if level_match else 1
+                    self.tracer.start_span('battle_turn')
 
-                    if wild_current_hp > 90:
+                    battle_state = BattleState(pok_name, wild_level, wild_current_hp, wild_max_hp)
+                    ball_name = self.ball_policy.choose(battle_state, self.ball_inventory)
+
+                    if ball_name is None:
                         await asyncio.sleep(1)
                         try:
                         # Click the first option 5 times
@@ -530,32 +634,29 @@ class PokemonHuntingEngine:
                             if not isinstance(e, MessageIdInvalidError):  # Suppress MessageIdInvalidError
                                 logger.warning(f'Failed to click first option for high-level {pok_name}: {e}')
 
-                    if wild_current_hp <= 90:
+                    else:
                         await asyncio.sleep(1)
+                        self.tracer.start_span('ball_throw')
                         try:
                             # Click "Poke Balls" 5 times
                             for _ in range(5):
                                 await event.click(text="Poke Balls")
                                 await asyncio.sleep(1)  # Add a small delay between clicks
 
-                            if pok_name in constants.REGULAR_BALL:
-                                await asyncio.sleep(1)
-                                # Click "Regular" 5 times
-                                for _ in range(5):
-                                    await event.click(text="Regular")
-                                    await asyncio.sleep(1)  # Add a small delay between clicks
-
-                            elif pok_name in constants.REPEAT_BALL:
-                                await asyncio.sleep(1)
-                                # Click "Repeat" 5 times
-                                for _ in range(5):
-                                    await event.click(text="Repeat")
-                                    await asyncio.sleep(1)  # Add a small delay between clicks
+                            await asyncio.sleep(1)
+                            # Click the chosen ball 5 times
+                            for _ in range(5):
+                                await event.click(text=ball_name)
+                                await asyncio.sleep(1)  # Add a small delay between clicks
+                            self.ball_inventory.consume(ball_name)
+                            self.activity_monitor.record_activity(activity_type=ActivityType.POKEBALL_USED, value=ball_name)
 
                         except Exception as e:
                             if not isinstance(e, MessageIdInvalidError):  # Suppress MessageIdInvalidError
                                 logger.exception(f"Failed to click buttons for {pok_name} with low health: {e}")
+                        self.tracer.end_span('ball_throw', pokemon=pok_name, ball=ball_name)
 
+                    self.tracer.end_span('battle_turn', pokemon=pok_name, hp_percentage=round(wild_health_percentage))
                     logger.info(f"{pok_name} health percentage: {wild_health_percentage}%")
                 else:
                     logger.info(f"Wild Pokemon {pok_name} HP not found in the battle description.")
@@ -563,6 +664,18 @@ class PokemonHuntingEngine:
                 logger.info("Wild Pokemon name not found in the battle description.")
 
    
+    async def handle_edited_message(self, event: events.MessageEdited.Event) -> None:
+        """Dispatches a Hexa edit to the battle handlers once, dropping repeated deliveries."""
+        if self.edit_deduplicator.is_duplicate(event.message):
+            self.activity_monitor.record_activity(activity_type=ActivityType.DUPLICATE_UPDATE_SUPPRESSED)
+            return
+        for handler in (self.battle, self.handle_after_battle, self.pokeSwitch):
+            try:
+                await handler(event)
+            except Exception as e:
+                logger.exception(f"Unexpected error in `{handler.__name__}`: {e}")
+
+
     async def handle_after_battle(self, event: events.MessageEdited.Event) -> None:
         """Handles messages indicating encounter skipped (fled, caught, etc.), and records Pokeball usage on catch."""
         if not self.automation_orchestrator.is_automation_active:
@@ -576,6 +689,7 @@ class PokemonHuntingEngine:
             if pd_match:
                 pd = pd_match.group(1)
                 self.activity_monitor.record_activity(activity_type=ActivityType.POKE_DOLLARS_ACCRUED, value=int(pd))
+            self.tracer.instant('result', outcome='caught' if 'You caught' in event.raw_text else 'ended')
             await self._transmit_hunt_command()
   
     async def skip(self, event: events.NewMessage.Event) -> None:
@@ -589,14 +703,17 @@ class PokemonHuntingEngine:
 
         if trainer_match:
             self.activity_monitor.record_activity(activity_type=ActivityType.SKIPPED_TRAINER)
+            self.tracer.instant('result', outcome='trainer')
             await self._transmit_hunt_command()
         elif tm_match:
             tm = tm_match.group(1)
             self.activity_monitor.record_activity(activity_type=ActivityType.ITEM_FOUND, value=f"TM{tm}")
+            self.tracer.instant('result', outcome='item')
             await self._transmit_hunt_command()
         elif stone_match:
             stone = stone_match.group(1)
             self.activity_monitor.record_activity(activity_type=ActivityType.ITEM_FOUND, value=f"{stone.capitalize()} stone")
+            self.tracer.instant('result', outcome='item')
             await self._transmit_hunt_command()
 
     async def pokeSwitch(self, event: events.MessageEdited.Event) -> None:
@@ -618,7 +735,8 @@ class PokemonHuntingEngine:
             button_clicked = buttons_to_click[0]
             logger.debug(f"Switching to Pokemon: {button_clicked}")
             try:
-                await self._click_button(event=event, text=button_clicked)
+                with self.tracer.span('switch', pokemon=button_clicked):
+                    await self._click_button(event=event, text=button_clicked)
             except (DataInvalidError, MessageIdInvalidError) as e:
                 logger.warning(f'Failed to click button: `{button_clicked}`: {e}')
             except Exception as e:
@@ -628,11 +746,10 @@ class PokemonHuntingEngine:
     def event_handlers(self) -> List[Dict[str, Callable | events.NewMessage]]:
         """Returns a list of event handler definitions."""
         return [
+            {'callback': self.observe_hexa_response, 'event': events.NewMessage(chats=constants.HEXA_BOT_ID)},
             {'callback': self.handle_daily_quota_exceeded, 'event': events.NewMessage(chats=constants.HEXA_BOT_ID)},
             {'callback': self.hunt_or_pass, 'event': events.NewMessage(chats=constants.HEXA_BOT_ID)},
             {'callback': self.battlefirst, 'event': events.NewMessage(chats=constants.HEXA_BOT_ID)},
-            {'callback': self.battle, 'event': events.MessageEdited(chats=constants.HEXA_BOT_ID)},
-            {'callback': self.handle_after_battle, 'event': events.MessageEdited(chats=constants.HEXA_BOT_ID)},
-            {'callback': self.skip, 'event': events.NewMessage(chats=constants.HEXA_BOT_ID)},
-            {'callback': self.pokeSwitch, 'event': events.MessageEdited(chats=constants.HEXA_BOT_ID)}
+            {'callback': self.handle_edited_message, 'event': events.MessageEdited(chats=constants.HEXA_BOT_ID)},
+            {'callback': self.skip, 'event': events.NewMessage(chats=constants.HEXA_BOT_ID)}
         ]
@@ -1,14 +1,110 @@
-import os
+import io
+import json
 import asyncio
+import itertools
+import contextlib
+from collections import deque
+from loguru import logger
+from PIL import Image, UnidentifiedImageError
 from telethon import events
 from telethon.tl.functions.messages import GetStickerSetRequest
-from telethon.tl.types import InputStickerSetShortName
+from telethon.tl.types import DocumentAttributeSticker, InputStickerSetEmpty, InputStickerSetShortName
 from telethon.errors import StickersetInvalidError
-from constants import TEMP_DOWNLOAD_PATH
+from constants import (
+    STICKER_SIZE, STICKER_WEBP_QUALITY, STICKER_PACK_LIMIT, STICKER_PACK_CACHE_PATH, STICKERS_BOT_TIMEOUT,
+    KANGSET_CONCURRENCY, KANGSET_PREFETCH, KANGSET_PROGRESS_PATH
+)
+from utility import ProgressMessage, write_json_atomic
+
+STICKERS_BOT = "Stickers"
+DEFAULT_EMOJI = "🤔"
+ANIMATED_STICKER_MIME_TYPES = ("application/x-tgsticker", "video/webm")
+
+# Lowercase phrases of @Stickers replies that mean a step failed. Kept to the
+# bot's exact error wording so ordinary prompts are never mistaken for errors.
+STICKERS_BOT_FULL_MARKERS = ("that's probably enough stickers for one set", "a set can't have more than")
+STICKERS_BOT_NOT_FOUND_MARKERS = ("invalid set selected",)
+STICKERS_BOT_ERROR_MARKERS = (
+    "sorry, the file type is invalid",
+    "sorry, the image dimensions are invalid",
+    "sorry, the file is too big",
+    "sorry, this short name is already taken",
+    "sorry, this short name is unacceptable",
+)
+
+
+class StickersBotError(Exception):
+    """Raised when @Stickers replies with an error instead of the next prompt."""
+
+
+class StickerPackFullError(StickersBotError):
+    """Raised when @Stickers refuses to add to a pack that is full."""
+
+
+class StickerPackNotFoundError(StickersBotError):
+    """Raised when @Stickers does not know the pack we asked to add to."""
+
+
+def convert_to_sticker(data):
+    """Converts image bytes to a named WebP `BytesIO` of at most `STICKER_SIZE` px; blocking, so call it through `asyncio.to_thread`."""
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGBA")
+        scale = STICKER_SIZE / max(image.size)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, "WEBP", quality=STICKER_WEBP_QUALITY)
+    buffer.name = "sticker.webp"
+    buffer.seek(0)
+    return buffer
+
+
+class JsonCounter:
+    """A `str -> int` mapping persisted as JSON, used for pack counts and kangset progress."""
+
+    def __init__(self, path):
+        self._path = path
+        self.counts = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.counts = {name: int(count) for name, count in json.load(f).items()}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"Could not load `{path}`: {e}")
+
+    def save(self):
+        """Writes the mapping to disk atomically."""
+        try:
+            write_json_atomic(self._path, self.counts)
+        except OSError as e:
+            logger.warning(f"Could not save `{self._path}`: {e}")
+
+
+class StickerQueue:
+    """Wraps an async iterator of `(sticker, emoji)` items so an item can be put back."""
+
+    def __init__(self, items):
+        self._items = items
+        self._returned = []
+
+    def put_back(self, item):
+        self._returned.append(item)
+
+    async def next(self):
+        """Returns the next item, or `None` once the iterator is exhausted."""
+        if self._returned:
+            return self._returned.pop()
+        return await anext(self._items, None)
+
 
 class KangManager:
     def __init__(self, client):
         self._client = client
+        self._sticker_bot_lock = asyncio.Lock()  # The @Stickers conversation is stateful, one kang at a time
+        self._pack_cache = JsonCounter(STICKER_PACK_CACHE_PATH)
+        self._kangset_progress = JsonCounter(KANGSET_PROGRESS_PATH)  # "<set>:<pack>" -> next sticker index
+        self._me_id = None
 
     async def kang(self, event):
         """Handles the `.kang` command to steal stickers or images."""
@@ -19,7 +115,7 @@ class KangManager:
         await event.edit("Kanging sticker...")
 
         # Default emoji and pack name
-        emoji = "🤔"
+        emoji = DEFAULT_EMOJI
         pack_name = "KangPack"
 
         # Parse arguments
@@ -36,70 +132,235 @@ class KangManager:
         if not self.is_valid_emoji(emoji):
             return await event.edit("Invalid emoji. Please provide a single valid emoji.")
 
-        # Download the sticker/image
-        sticker_path = os.path.join(TEMP_DOWNLOAD_PATH, "kang.webp")
-        await reply.download_media(file=sticker_path)
+        if reply.file is None or reply.file.mime_type in ANIMATED_STICKER_MIME_TYPES:
+            return await event.edit("Only images and static stickers can be kanged.")
+
+        # Download and convert in memory; Pillow runs off the event loop
+        data = await reply.download_media(file=bytes)
+        try:
+            sticker = await asyncio.to_thread(convert_to_sticker, data)
+        except (UnidentifiedImageError, OSError):
+            return await event.edit("Unsupported media. Reply to a sticker or image to kang!")
 
         # Upload and add sticker to pack
-        success = await self.add_sticker_to_pack(event, sticker_path, emoji, pack_name)
-        if success:
-            await event.edit(f"Sticker kanged successfully! {emoji}\nPack: `{pack_name}`")
-        else:
-            await event.edit("Failed to add sticker. Try again later!")
+        async with self._sticker_bot_lock:
+            try:
+                pack_short_name = await self.add_sticker_to_pack(sticker, emoji, pack_name)
+            except StickersBotError as e:
+                return await event.edit(f"Failed to add sticker: {e}")
+            except asyncio.TimeoutError:
+                return await event.edit("Failed to add sticker: @Stickers did not reply. Try again later!")
+        await event.edit(f'Sticker kanged successfully! {emoji}\nPack: <a href="https://t.me/addstickers/{pack_short_name}">{pack_short_name}</a>')
+
+    async def _prepare_stickers(self, documents, emojis, start):
+        """Yields `(sticker, emoji, index)` for `documents[start:]` in order, preparing a few ahead."""
+        semaphore = asyncio.Semaphore(KANGSET_CONCURRENCY)
+
+        async def prepare(document):
+            async with semaphore:
+                data = await self._client.download_media(document, file=bytes)
+                return await asyncio.to_thread(convert_to_sticker, data)
 
-        # Clean up the temporary file
-        if os.path.exists(sticker_path):
-            os.remove(sticker_path)
+        pending = deque()
+        remaining = iter(range(start, len(documents)))
+
+        def schedule():
+            for index in itertools.islice(remaining, KANGSET_PREFETCH - len(pending)):
+                pending.append((index, asyncio.create_task(prepare(documents[index]))))
+
+        try:
+            schedule()
+            while pending:
+                index, task = pending.popleft()
+                try:
+                    sticker = await task
+                except Exception as e:
+                    logger.warning(f"Skipping sticker {index} of the set: {e}")
+                    continue
+                finally:
+                    schedule()
+                yield sticker, emojis.get(documents[index].id, DEFAULT_EMOJI), index
+        finally:
+            for _, task in pending:
+                task.cancel()
 
-    async def add_sticker_to_pack(self, event, sticker_path, emoji, pack_name):
-        """Adds the sticker to the user's sticker pack."""
-        user = await event.client.get_me()
-        pack_short_name = f"{user.id}_{pack_name}_kang"
+    async def kang_set(self, event):
+        """Handles `.kangset [set] [pack]` to copy a whole sticker set into my pack, resuming interrupted runs."""
+        reply = await event.get_reply_message()
+        args = [arg for arg in event.pattern_match.groups() if arg]
+        stickerset = None
+        if reply and reply.sticker:
+            for attribute in reply.sticker.attributes:
+                if isinstance(attribute, DocumentAttributeSticker):
+                    stickerset = attribute.stickerset
+        elif args:
+            stickerset = InputStickerSetShortName(args.pop(0))
+        if stickerset is None or isinstance(stickerset, InputStickerSetEmpty):
+            return await event.edit("Reply to a sticker from a set or give a set's short name: `.kangset [set] [pack]`")
+        pack_name = args[0] if args else "KangPack"
 
         try:
-            # Check if pack exists
-            sticker_set = await event.client(GetStickerSetRequest(InputStickerSetShortName(pack_short_name)))
+            sticker_set = await self._client(GetStickerSetRequest(stickerset, hash=0))
         except StickersetInvalidError:
-            sticker_set = None
-
-        if not sticker_set:
-            # Create a new sticker pack
-            return await self.create_new_sticker_pack(event, sticker_path, emoji, pack_short_name)
-
-        # Add sticker to existing pack
-        return await self.add_sticker_to_existing_pack(event, sticker_path, emoji, pack_short_name)
-
-    async def create_new_sticker_pack(self, event, sticker_path, emoji, pack_short_name):
-        """Creates a new sticker pack and adds the sticker."""
-        client = event.client
-
-        async def send_and_wait(text):
-            await client.send_message("Stickers", text)
-            await asyncio.sleep(2)  # Give some time for the bot to process
-
-        await send_and_wait("/newpack")
-        await send_and_wait(pack_short_name)
-        await client.send_file("Stickers", sticker_path, force_document=False)
-        await send_and_wait(emoji)
-        await send_and_wait("/publish")
-        await send_and_wait(pack_short_name)
-        
-        return True
+            return await event.edit("Sticker set not found.")
+        documents = sticker_set.documents
+        if any(document.mime_type in ANIMATED_STICKER_MIME_TYPES for document in documents):
+            return await event.edit("Only static sticker sets can be kanged.")
+
+        emojis = {}
+        for pack in sticker_set.packs:
+            for document_id in pack.documents:
+                emojis.setdefault(document_id, pack.emoticon)
+
+        progress_key = f"{sticker_set.set.short_name}:{pack_name}"
+        start = self._kangset_progress.counts.get(progress_key, 0)
+        total = len(documents)
+        added = 0
+        progress = ProgressMessage(event)
+
+        async def on_added(pack_short_name, item):
+            nonlocal added
+            added += 1
+            self._kangset_progress.counts[progress_key] = item[2] + 1
+            await asyncio.to_thread(self._kangset_progress.save)
+            await progress.update(f"Kanging `{sticker_set.set.short_name}`... {item[2] + 1}/{total}\nPack: `{pack_short_name}`")
+
+        await event.edit(f"Kanging `{sticker_set.set.short_name}`... {start}/{total}" + (" (resuming)" if start else ""))
+        async with self._sticker_bot_lock:
+            try:
+                async with contextlib.aclosing(self._prepare_stickers(documents, emojis, start)) as stickers:
+                    await self.add_stickers_to_pack(stickers, pack_name, on_added)
+            except StickersBotError as e:
+                return await event.edit(f"Stopped after {added} stickers: {e}\nRun the command again to resume.")
+            except asyncio.TimeoutError:
+                return await event.edit(f"Stopped after {added} stickers: @Stickers did not reply.\nRun the command again to resume.")
+
+        self._kangset_progress.counts.pop(progress_key, None)
+        await asyncio.to_thread(self._kangset_progress.save)
+        await event.edit(f"Kanged {added} stickers from `{sticker_set.set.short_name}` into `{pack_name}`!")
+
+    async def _ask(self, conversation, message=None, file=None):
+        """Sends one step to @Stickers and returns its reply text, raising `StickersBotError` on an error reply."""
+        if file is not None:
+            file.seek(0)
+            await conversation.send_file(file, force_document=True)
+        else:
+            await conversation.send_message(message)
+        response = await conversation.get_response()
+        text = response.raw_text
+        lowered = text.lower()
+        if any(marker in lowered for marker in STICKERS_BOT_FULL_MARKERS):
+            raise StickerPackFullError(text)
+        if any(marker in lowered for marker in STICKERS_BOT_NOT_FOUND_MARKERS):
+            raise StickerPackNotFoundError(text)
+        if any(marker in lowered for marker in STICKERS_BOT_ERROR_MARKERS):
+            raise StickersBotError(text)
+        return text
+
+    async def _pack_count(self, pack_short_name):
+        """Returns how many stickers a pack holds, or `None` if it does not exist."""
+        count = self._pack_cache.counts.get(pack_short_name)
+        if count is None:
+            try:
+                sticker_set = await self._client(GetStickerSetRequest(InputStickerSetShortName(pack_short_name), hash=0))
+            except StickersetInvalidError:
+                return None
+            count = self._pack_cache.counts[pack_short_name] = sticker_set.set.count
+        return count
+
+    async def add_sticker_to_pack(self, sticker, emoji, pack_name):
+        """Adds one sticker to the user's sticker pack and returns the pack's short name."""
+        added_to = []
+
+        async def single():
+            yield sticker, emoji
+
+        async def on_added(pack_short_name, item):
+            added_to.append(pack_short_name)
+
+        await self.add_stickers_to_pack(single(), pack_name, on_added)
+        return added_to[-1]
+
+    async def add_stickers_to_pack(self, stickers, pack_name, on_added):
+        """Adds every `(sticker, emoji)` item of an async iterator to the user's packs, rolling over when full."""
+        if self._me_id is None:
+            self._me_id = (await self._client.get_me()).id
+        base_short_name = f"{self._me_id}_{pack_name}_kang"
+        queue = StickerQueue(stickers)
+
+        try:
+            for volume in itertools.count(1):
+                pack_short_name = base_short_name if volume == 1 else f"{base_short_name}_{volume}"
+                count = await self._pack_count(pack_short_name)
+                if count is not None and count >= STICKER_PACK_LIMIT:
+                    continue
+                try:
+                    more = await self._fill_pack(queue, pack_short_name, exists=count is not None, on_added=on_added)
+                except StickerPackNotFoundError:
+                    more = await self._fill_pack(queue, pack_short_name, exists=False, on_added=on_added)
+                if not more:
+                    return
+        except (StickersBotError, asyncio.TimeoutError):
+            await self._client.send_message(STICKERS_BOT, "/cancel")  # Leave the bot in a clean state
+            raise
+        finally:
+            await asyncio.to_thread(self._pack_cache.save)
 
-    async def add_sticker_to_existing_pack(self, event, sticker_path, emoji, pack_short_name):
-        """Adds a sticker to an existing sticker pack."""
-        client = event.client
+    async def _fill_pack(self, queue, pack_short_name, exists, on_added):
+        """Adds queued stickers to one pack in a single @Stickers session. Returns whether items are left."""
+        item = await queue.next()
+        if item is None:
+            return False
 
-        async def send_and_wait(text):
-            await client.send_message("Stickers", text)
-            await asyncio.sleep(2)
+        unpublished = []
+        async with self._client.conversation(STICKERS_BOT, timeout=STICKERS_BOT_TIMEOUT) as conversation:
+            try:
+                await self._ask(conversation, "/addsticker" if exists else "/newpack")
+                await self._ask(conversation, pack_short_name)
+                count = self._pack_cache.counts.get(pack_short_name, 0) if exists else 0
+                while item is not None:
+                    await self._ask(conversation, file=item[0])
+                    await self._ask(conversation, item[1])
+                    count += 1
+                    if exists:
+                        self._pack_cache.counts[pack_short_name] = count
+                        await on_added(pack_short_name, item)
+                    else:
+                        unpublished.append(item)
+                    item = None if count >= STICKER_PACK_LIMIT else await queue.next()
+                    if item is None:
+                        break
 
-        await send_and_wait("/addsticker")
-        await send_and_wait(pack_short_name)
-        await client.send_file("Stickers", sticker_path, force_document=False)
-        await send_and_wait(emoji)
-        await send_and_wait("/done")
+                if exists:
+                    await self._ask(conversation, "/done")
+                else:
+                    reply = await self._ask(conversation, "/publish")
+                    if "/skip" in reply:
+                        await self._ask(conversation, "/skip")  # Pack icon
+                    await self._ask(conversation, pack_short_name)
+                    self._pack_cache.counts[pack_short_name] = count
+                    for published in unpublished:
+                        await on_added(pack_short_name, published)
+            except StickerPackNotFoundError:
+                if not exists:
+                    raise
+                # The pack was deleted since we cached it
+                self._pack_cache.counts.pop(pack_short_name, None)
+                await conversation.send_message("/cancel")
+                queue.put_back(item)
+                raise
+            except StickerPackFullError:
+                if not exists:
+                    raise
+                # Our cached count was stale; move on to the next pack
+                self._pack_cache.counts[pack_short_name] = STICKER_PACK_LIMIT
+                await conversation.send_message("/cancel")
 
+        if item is None:
+            item = await queue.next()
+            if item is None:
+                return False
+        queue.put_back(item)
         return True
 
     def is_valid_emoji(self, emoji):
@@ -109,5 +370,6 @@ class KangManager:
     def get_event_handlers(self):
         """Returns event handlers for kang."""
         return [
-            {'callback': self.kang, 'event': events.NewMessage(pattern=r"\.kang(?: .+)?", outgoing=True)},
+            {'callback': self.kang, 'event': events.NewMessage(pattern=r"\.kang(?: .+)?$", outgoing=True)},
+            {'callback': self.kang_set, 'event': events.NewMessage(pattern=r"\.kangset(?: (\S+))?(?: (\S+))?$", outgoing=True)},
         ]
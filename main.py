@@ -35,6 +35,7 @@ async def main():
 
             # Keep the client running until disconnected
             await client.run_until_disconnected()
+            await manager.stop()
 
         except AuthKeyDuplicatedError:
             logger.error("AuthKeyDuplicatedError: Invalid session. Please update SESSION.")
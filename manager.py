@@ -1,8 +1,11 @@
+import asyncio
+import io
 import time
 from typing import List, Dict, Callable
 
 from loguru import logger
 from telethon import events
+from telethon.tl.types import UpdateChannelParticipant, UpdateChatParticipant, UpdateChatParticipantAdmin
 
 import constants
 from evaluate import ExpressionEvaluator
@@ -16,6 +19,7 @@ from purge import PurgeManager
 from clone import CloneManager
 from admin import AdminManager
 from kang import KangManager
+from sampler import sampling_profiler
 
 HELP_MESSAGE = """**Help Menu**  
 
@@ -23,10 +27,11 @@ HELP_MESSAGE = """**Help Menu**
 • `.ping` - Pong!  
 • `.alive` - Bot status  
 • `.help` - Show this menu  
+• `.sampler (on/off/dump/reset)` - Sampling profiler, `dump` sends a flamegraph-compatible file  
 
 **Pokémon Commands:**  
 • `.guess (on/off/stats)` - Pokémon guessing game  
-• `.hunt (on/off/stats)` - Pokémon hunting  
+• `.hunt (on/off/stats/sim)` - Pokémon hunting, `sim` compares ball policies  
 • `.list <category>` - List Pokémon by category  
 • `.release` - Pokémon release commands  
 
@@ -38,6 +43,10 @@ HELP_MESSAGE = """**Help Menu**
 • `.promote <user_id/reply>` - Make a user admin  
 • `.demote <user_id/reply>` - Remove admin rights  
 • `.kick <user_id/reply>` - Kick a user  
+• `.bulk(ban/unban/mute/unmute/kick) <ids/usernames | last N>` - Act on many users at once  
+• `.sweep deleted [dry]` - Kick deleted accounts  
+• `.sweep inactive <days> [dry]` - Kick members not seen for `<days>` days  
+• `.modstats` - Muted-user filter statistics  
 
 **Other Commands:**  
 • `.afk (message)` - Set AFK status  
@@ -46,9 +55,13 @@ HELP_MESSAGE = """**Help Menu**
 • `.delayspam <msg> <count> <delay>` - Spam with delay  
 • `.stopspam` - Stop spam  
 • `.purge <count>` - Delete the last `<count>` messages  
-• `.clone` - Clone a user's profile (name, bio, username, and PFP)  
-• `.revert` - Restore your original profile and remove cloned PFP  
+• `.purge` (reply) - Delete everything from the replied message onwards  
+• `.purge me|media|from <user> [count]` - Delete only my messages, photos/videos, or a user's messages (reply or count)  
+• `.purgeme [here]` - Delete my own messages in every chat (or only this one)  
+• `.clone [snapshot]` - Clone a user's profile (name, bio, and PFP), saving yours as `snapshot`  
+• `.revert [snapshot]` - Restore a saved profile and remove cloned PFPs  
 • `.kang` - Steal stickers/images to your sticker pack  
+• `.kangset [set] [pack]` - Copy a whole sticker set (reply to one of its stickers or give its short name)  
 """
 
 class Manager:
@@ -66,7 +79,8 @@ class Manager:
         '_purge_manager',
         '_clone_manager',
         '_admin_manager',
-        '_kang_manager'
+        '_kang_manager',
+        '_sampler'
     )
 
     def __init__(self, client) -> None:
@@ -82,6 +96,7 @@ class Manager:
         self._clone_manager = CloneManager(client)
         self._admin_manager = AdminManager(client)
         self._kang_manager = KangManager(client)
+        self._sampler = sampling_profiler
 
     def start(self) -> None:
         """Starts the Userbot's automations."""
@@ -90,6 +105,9 @@ class Manager:
         self._hunter.start()
         self._evaluator.start()
         self._alive_handler.register()
+        self._release_manager.start()
+        self._admin_manager.start()
+        self._purge_manager.start()
 
         # Add AFK event handlers
         for handler in self._afk_manager.get_event_handlers():
@@ -101,6 +119,15 @@ class Manager:
             self._client.add_event_handler(self._wrap_handler(handler['callback']), handler['event'])
             logger.debug(f'[{self.__class__.__name__}] Added event handler: `{handler["callback"].__name__}`')
 
+    async def stop(self) -> None:
+        """Stops background work tied to the disconnected client."""
+        await asyncio.gather(
+            self._admin_manager.stop(),
+            self._release_manager.stop(),
+            self._hunter.tracer.close(),
+            self._purge_manager.message_index.close()
+        )
+
     def _wrap_handler(self, callback):
         """Wraps an event handler to catch and log exceptions."""
         async def wrapped_handler(event):
@@ -129,6 +156,28 @@ class Manager:
         """Handles user requests to enable/disable hunter automation."""
         await self._hunter.handle_automation_control_request(event)
 
+    async def handle_sampler_command(self, event) -> None:
+        """Handles `.sampler on/off/dump/reset` for the event loop sampling profiler."""
+        action = event.pattern_match.group(1)
+        if action == 'on':
+            # Handlers run on the event loop thread, so this samples the loop.
+            started = self._sampler.start()
+            await event.edit('Sampler started.' if started else 'Sampler is already running.')
+        elif action == 'off':
+            stopped = self._sampler.stop()
+            await event.edit(self._sampler.status() if stopped else 'Sampler is not running.')
+        elif action == 'reset':
+            self._sampler.reset()
+            await event.edit('Sampler reset.')
+        else:
+            collapsed = self._sampler.dump()
+            if not collapsed:
+                await event.edit(f'No samples yet.\n{self._sampler.status()}')
+                return
+            document = io.BytesIO(collapsed.encode('utf-8'))
+            document.name = 'sampler.collapsed'
+            await event.reply(self._sampler.status(), file=document)
+
     async def list_pokemon(self, event) -> None:
         """Handles the `.list` command by showing Pokémon based on the specified category."""
         args = event.pattern_match.group(1)
@@ -182,15 +231,25 @@ class Manager:
             {'callback': self._release_manager.add_pokemon, 'event': events.NewMessage(pattern=r"\.release add (.+)", outgoing=True)},
             {'callback': self._release_manager.remove_pokemon, 'event': events.NewMessage(pattern=r"\.release remove (.+)", outgoing=True)},
             {'callback': self._release_manager.list_pokemon, 'event': events.NewMessage(pattern=r"\.release list", outgoing=True)},
+            {'callback': self._release_manager.handle_hexa_update, 'event': events.NewMessage(from_users=constants.HEXA_BOT_ID)},
+            {'callback': self._release_manager.handle_hexa_update, 'event': events.MessageEdited(from_users=constants.HEXA_BOT_ID)},
+            {'callback': self._release_manager.sync_inventory, 'event': events.NewMessage(pattern=r"\.release sync$", outgoing=True)},
+            {'callback': self._release_manager.handle_inventory_listing, 'event': events.NewMessage(from_users=constants.HEXA_BOT_ID)},
+            {'callback': self._release_manager.handle_inventory_listing, 'event': events.MessageEdited(from_users=constants.HEXA_BOT_ID)},
+            {'callback': self._release_manager.track_catches, 'event': events.NewMessage(from_users=constants.HEXA_BOT_ID)},
+            {'callback': self._release_manager.track_catches, 'event': events.MessageEdited(from_users=constants.HEXA_BOT_ID)},
             {'callback': self.handle_guesser_automation_control_request, 'event': events.NewMessage(pattern=constants.GUESSER_COMMAND_REGEX, outgoing=True)},
             {'callback': self.handle_hunter_automation_control_request, 'event': events.NewMessage(pattern=constants.HUNTER_COMMAND_REGEX, outgoing=True)},
             {'callback': self.list_pokemon, 'event': events.NewMessage(pattern=constants.LIST_COMMAND_REGEX, outgoing=True)}, 
+            {'callback': self.handle_sampler_command, 'event': events.NewMessage(pattern=constants.SAMPLER_COMMAND_REGEX, outgoing=True)},
             {'callback': self._spam_manager.spam, 'event': events.NewMessage(pattern=r"\.spam (.+) (\d+)", outgoing=True)},
             {'callback': self._spam_manager.delay_spam, 'event': events.NewMessage(pattern=r"\.delayspam (.+) (\d+) (\d+)", outgoing=True)},
             {'callback': self._spam_manager.stop_spam, 'event': events.NewMessage(pattern=r"\.stopspam$", outgoing=True)},
-            {'callback': self._purge_manager.purge_messages, 'event': events.NewMessage(pattern=r"\.purge (\d+)", outgoing=True)},
-            {'callback': self._clone_manager.clone, 'event': events.NewMessage(pattern=r"\.clone$", outgoing=True)},
-            {'callback': self._clone_manager.revert, 'event': events.NewMessage(pattern=r"\.revert$", outgoing=True)},
+            {'callback': self._purge_manager.purge_messages, 'event': events.NewMessage(pattern=r"\.purge(?: (me|media|from \S+))?(?: (\d+))?$", outgoing=True)},
+            {'callback': self._purge_manager.purge_mine, 'event': events.NewMessage(pattern=r"\.purgeme(?: (here))?$", outgoing=True)},
+            {'callback': self._purge_manager.index_outgoing, 'event': events.NewMessage(outgoing=True)},
+            {'callback': self._clone_manager.clone, 'event': events.NewMessage(pattern=r"\.clone(?: (\S+))?$", outgoing=True)},
+            {'callback': self._clone_manager.revert, 'event': events.NewMessage(pattern=r"\.revert(?: (\S+))?$", outgoing=True)},
             {'callback': self._admin_manager.ban_user, 'event': events.NewMessage(pattern=r"\.ban(?: (\d+))?", outgoing=True)},
             {'callback': self._admin_manager.unban_user, 'event': events.NewMessage(pattern=r"\.unban(?: (\d+))?", outgoing=True)},
             {'callback': self._admin_manager.mute_user, 'event': events.NewMessage(pattern=r"\.mute(?: (\d+))?", outgoing=True)},
@@ -198,6 +257,11 @@ class Manager:
             {'callback': self._admin_manager.promote_user, 'event': events.NewMessage(pattern=r"\.promote(?: (\d+))?", outgoing=True)},
             {'callback': self._admin_manager.demote_user, 'event': events.NewMessage(pattern=r"\.demote(?: (\d+))?", outgoing=True)},
             {'callback': self._admin_manager.kick_user, 'event': events.NewMessage(pattern=r"\.kick(?: (\d+))?", outgoing=True)},
-            {'callback': self._kang_manager.kang, 'event': events.NewMessage(pattern=r"\.kang(?: .+)?", outgoing=True)},
+            {'callback': self._admin_manager.sweep_participants, 'event': events.NewMessage(pattern=r"\.sweep (deleted|inactive)(?: (\d+))?( dry)?$", outgoing=True)},
+            {'callback': self._admin_manager.bulk_action, 'event': events.NewMessage(pattern=r"\.bulk(ban|unban|mute|unmute|kick) (.+)", outgoing=True)},
+            {'callback': self._kang_manager.kang, 'event': events.NewMessage(pattern=r"\.kang(?: .+)?$", outgoing=True)},
+            {'callback': self._kang_manager.kang_set, 'event': events.NewMessage(pattern=r"\.kangset(?: (\S+))?(?: (\S+))?$", outgoing=True)},
+            {'callback': self._admin_manager.show_moderation_stats, 'event': events.NewMessage(pattern=r"\.modstats$", outgoing=True)},
             {'callback': self._admin_manager.delete_muted_messages, 'event': events.NewMessage()},  # Auto-delete muted users' messages
+            {'callback': self._admin_manager.handle_participant_update, 'event': events.Raw([UpdateChannelParticipant, UpdateChatParticipant, UpdateChatParticipantAdmin])},
         ]
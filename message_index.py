@@ -0,0 +1,143 @@
+import asyncio
+import os
+from array import array
+from typing import Dict, Iterator, Tuple
+
+from loguru import logger
+
+import constants
+from utility import DebouncedFlush
+
+INDEX_FILE_SUFFIX = '.ids'
+
+
+class OutgoingMessageIndex:
+    """Per-chat index of our own outgoing message ids.
+
+    Each chat's ids live in an `array('i')` (4 bytes per message) and on disk
+    as the array's raw bytes in `<chat_id>.ids`, so new ids are persisted by
+    appending and loading is a single `fromfile`. Appends are buffered and
+    written in batches off the event loop.
+    """
+
+    def __init__(self, path: str = constants.OUTGOING_INDEX_PATH) -> None:
+        self._path = path
+        self._ids: Dict[int, array] = {}
+        self._pending: Dict[int, array] = {}
+        self._flusher = DebouncedFlush(self.flush, constants.OUTGOING_INDEX_FLUSH_INTERVAL, lambda: self._pending)
+        self._lock = asyncio.Lock()  # Serialises appends with rewrites so neither sees a half-updated file
+        self.loaded = False
+
+    def _file(self, chat_id: int) -> str:
+        return os.path.join(self._path, f'{chat_id}{INDEX_FILE_SUFFIX}')
+
+    async def load(self) -> int:
+        """Reads every chat's index from disk off the event loop. Returns the number of ids loaded.
+
+        Ids recorded before the load finishes are kept after the loaded ones.
+        Only the first call reads the disk.
+        """
+        if self.loaded:
+            return 0
+        self.loaded = True
+        async with self._lock:
+            loaded = await asyncio.to_thread(self._read_all)
+            total = sum(len(ids) for ids in loaded.values())
+            for chat_id, ids in loaded.items():
+                ids.extend(self._ids.get(chat_id, ()))
+                self._ids[chat_id] = ids
+        return total
+
+    def _read_all(self) -> Dict[int, array]:
+        loaded: Dict[int, array] = {}
+        if not os.path.isdir(self._path):
+            return loaded
+        for name in os.listdir(self._path):
+            if not name.endswith(INDEX_FILE_SUFFIX):
+                continue
+            try:
+                chat_id = int(name[:-len(INDEX_FILE_SUFFIX)])
+                ids = array('i')
+                with open(os.path.join(self._path, name), 'rb') as f:
+                    ids.frombytes(f.read())
+            except (ValueError, OSError) as e:
+                logger.warning(f'[{self.__class__.__name__}] Skipping unreadable index `{name}`: {e}')
+                continue
+            loaded[chat_id] = ids
+        return loaded
+
+    def add(self, chat_id: int, message_id: int) -> None:
+        """Records an outgoing message and schedules it to be written."""
+        self._ids.setdefault(chat_id, array('i')).append(message_id)
+        self._pending.setdefault(chat_id, array('i')).append(message_id)
+        self._flusher.schedule()
+
+    def chats(self) -> Iterator[Tuple[int, array]]:
+        """Yields `(chat_id, ids)` for every chat with indexed messages."""
+        for chat_id, ids in list(self._ids.items()):
+            if ids:
+                yield chat_id, ids
+
+    def get(self, chat_id: int) -> array:
+        return self._ids.get(chat_id, array('i'))
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._ids.values())
+
+    async def remove(self, chat_id: int, message_ids) -> None:
+        """Forgets the given ids of a chat in memory and on disk, keeping any others.
+
+        The chat's file is rewritten with the remaining ids, which already
+        include its buffered ones, so ids recorded meanwhile are not lost and
+        a later flush cannot bring the removed ones back.
+        """
+        removed = set(message_ids)
+        async with self._lock:
+            remaining = array('i', (message_id for message_id in self.get(chat_id) if message_id not in removed))
+            self._pending.pop(chat_id, None)
+            if remaining:
+                self._ids[chat_id] = remaining
+            else:
+                self._ids.pop(chat_id, None)
+            try:
+                await asyncio.to_thread(self._rewrite, chat_id, array('i', remaining))
+            except OSError as e:
+                logger.warning(f'[{self.__class__.__name__}] Failed to rewrite index for {chat_id}: {e}')
+
+    async def close(self) -> None:
+        """Writes any buffered ids now instead of waiting for the next flush."""
+        await self._flusher.close()
+
+    async def flush(self) -> None:
+        """Appends every buffered id to its chat's file."""
+        async with self._lock:
+            batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except OSError as e:
+                logger.error(f'[{self.__class__.__name__}] Failed to write message index: {e}')
+
+    def _write(self, batch: Dict[int, array]) -> None:
+        os.makedirs(self._path, exist_ok=True)
+        for chat_id, ids in batch.items():
+            with open(self._file(chat_id), 'ab') as f:
+                ids.tofile(f)
+
+    def _rewrite(self, chat_id: int, ids: array) -> None:
+        path = self._file(chat_id)
+        if not ids:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return
+        os.makedirs(self._path, exist_ok=True)
+        with open(f'{path}.tmp', 'wb') as f:
+            ids.tofile(f)
+        os.replace(f'{path}.tmp', path)
+
+
+# Shared across PurgeManager instances so ids buffered before a reconnect are not lost to the next one.
+outgoing_index = OutgoingMessageIndex()
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from loguru import logger
+
+import constants
+from utility import DebouncedFlush
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS moderation (
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    PRIMARY KEY (chat_id, user_id, kind)
+)
+"""
+
+
+class ModerationStore:
+    """SQLite persistence for per-chat muted, banned and admin sets.
+
+    Reads happen once at startup; the in-memory sets in `admin.py` stay the
+    source of truth for lookups. Changes are queued and written in batches
+    by a single worker thread, so the event loop never waits on SQLite.
+    """
+
+    def __init__(self, path: str = constants.MODERATION_DB_PATH) -> None:
+        self._path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='moderation-store')
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pending: List[Tuple[str, int, int, str]] = []
+        self._flusher = DebouncedFlush(self.flush, constants.MODERATION_FLUSH_INTERVAL, lambda: self._pending)
+        self.loaded = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self._path) or '.', exist_ok=True)
+            self._connection = sqlite3.connect(self._path, check_same_thread=False)
+            self._connection.execute(SCHEMA)
+        return self._connection
+
+    async def load(self) -> List[Tuple[int, int, str]]:
+        """Returns every stored (chat_id, user_id, kind) row. Called once at startup."""
+        rows = await asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            lambda: self._connect().execute('SELECT chat_id, user_id, kind FROM moderation').fetchall()
+        )
+        self.loaded = True
+        return rows
+
+    def add(self, chat_id: int, user_id: int, kind: str) -> None:
+        self._queue(('add', chat_id, user_id, kind))
+
+    def discard(self, chat_id: int, user_id: int, kind: str) -> None:
+        self._queue(('discard', chat_id, user_id, kind))
+
+    def _queue(self, operation: Tuple[str, int, int, str]) -> None:
+        self._pending.append(operation)
+        self._flusher.schedule()
+
+    async def flush(self) -> None:
+        """Writes every queued change in one transaction on the store's thread."""
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._write, batch)
+        except sqlite3.Error as e:
+            logger.error(f'[{self.__class__.__name__}] Failed to write {len(batch)} moderation change(s): {e}')
+
+    def _write(self, batch: List[Tuple[str, int, int, str]]) -> None:
+        connection = self._connect()
+        with connection:
+            for operation, chat_id, user_id, kind in batch:
+                if operation == 'add':
+                    connection.execute(
+                        'INSERT OR IGNORE INTO moderation (chat_id, user_id, kind) VALUES (?, ?, ?)',
+                        (chat_id, user_id, kind)
+                    )
+                else:
+                    connection.execute(
+                        'DELETE FROM moderation WHERE chat_id = ? AND user_id = ? AND kind = ?',
+                        (chat_id, user_id, kind)
+                    )
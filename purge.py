@@ -1,29 +1,150 @@
 import asyncio
+from loguru import logger
 from telethon import events
+from telethon.errors import UsernameInvalidError, UsernameNotOccupiedError
+from telethon.tl.types import InputMessagesFilterPhotoVideo
+
+import constants
+from message_index import outgoing_index
+from utility import ProgressMessage, RateLimiter, retry_on_flood_wait
 
 class PurgeManager:
     """Handles message purging functionality."""
 
     def __init__(self, client):
         self._client = client
+        self.message_index = outgoing_index
+        self._load_task = None
 
-    async def purge_messages(self, event):
-        """Handles the `.purge <count>` command to delete messages."""
-        args = event.raw_text.split()
-        if len(args) != 2 or not args[1].isdigit():
-            return await event.reply("Usage: `.purge <count>`")
+    def start(self):
+        """Loads the outgoing-message index in the background, once per process."""
+        if not self.message_index.loaded:
+            self._load_task = asyncio.create_task(self._load_index())
+
+    async def _load_index(self):
+        logger.info(f"Loaded {await self.message_index.load()} indexed outgoing messages.")
+
+    async def index_outgoing(self, event):
+        """Records every outgoing message id for `.purgeme`."""
+        self.message_index.add(event.chat_id, event.id)
+
+    async def _delete_stream(self, chat, message_ids, on_progress):
+        """Deletes ids from an async iterable in concurrent chunks as they arrive. Returns `(deleted, failed)`."""
+        semaphore = asyncio.Semaphore(constants.PURGE_CONCURRENCY)
+        counts = {"deleted": 0, "failed": 0}
+        tasks = set()
+
+        async def delete_chunk(chunk):
+            try:
+                await retry_on_flood_wait(self._client.delete_messages, chat, chunk)
+                counts["deleted"] += len(chunk)
+            except Exception as e:
+                counts["failed"] += len(chunk)
+                logger.warning(f"Failed to delete {len(chunk)} messages in {chat}: {e}")
+            finally:
+                semaphore.release()
+
+        async def submit(chunk):
+            await semaphore.acquire()
+            task = asyncio.create_task(delete_chunk(chunk))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            await on_progress(counts["deleted"])
+
+        chunk = []
+        async for message_id in message_ids:
+            chunk.append(message_id)
+            if len(chunk) >= constants.PURGE_CHUNK_SIZE:
+                await submit(chunk)
+                chunk = []
+        if chunk:
+            await submit(chunk)
+        if tasks:
+            await asyncio.gather(*tasks)
+        return counts["deleted"], counts["failed"]
+
+    async def _run_purge(self, event, message_ids):
+        """Streams `message_ids` into `_delete_stream` with a live progress message."""
+        status = await event.reply("Purging...")
+        progress = ProgressMessage(status)
 
-        count = int(args[1])
-        if count <= 0:
+        async def on_progress(deleted):
+            await progress.update(f"Purging... {deleted} deleted so far.")
+
+        deleted, failed = await self._delete_stream(event.chat_id, message_ids(status.id), on_progress)
+        summary = f"Deleted {deleted} messages!"
+        if failed:
+            summary += f" ({failed} could not be deleted)"
+        await progress.edit(summary)
+        await asyncio.sleep(3)  # Wait for 3 seconds
+        await status.delete()  # Delete the confirmation message
+
+    async def purge_messages(self, event):
+        """Handles `.purge [me|media|from <user>] [count]`, or a reply to purge from that message up to the command."""
+        mode, count = event.pattern_match.group(1), event.pattern_match.group(2)
+        count = int(count) if count else None
+        if count is not None and count <= 0:
             return await event.reply("Count must be greater than 0.")
+        if count is None and not event.is_reply:
+            return await event.reply("Usage: `.purge [me|media|from <user>] <count>` or reply to a message with `.purge [me|media|from <user>]`")
 
         chat = event.chat_id
-        to_delete = []
-        async for message in self._client.iter_messages(chat, limit=count):
-            to_delete.append(message.id)
-
-        if to_delete:
-            await self._client.delete_messages(chat, to_delete)
-            confirmation = await event.reply(f"Deleted {len(to_delete)} messages!")
-            await asyncio.sleep(3)  # Wait for 3 seconds
-            await confirmation.delete()  # Delete the confirmation message
+        min_id = event.reply_to_msg_id - 1 if event.is_reply else 0
+        search = {}
+        if mode == "me":
+            search["from_user"] = "me"
+        elif mode == "media":
+            search["filter"] = InputMessagesFilterPhotoVideo
+        elif mode:
+            user = mode.split(" ", 1)[1]
+            try:
+                search["from_user"] = await self._client.get_input_entity(int(user) if user.lstrip("-").isdigit() else user)
+            except (TypeError, ValueError, UsernameInvalidError, UsernameNotOccupiedError):
+                return await event.reply(f"Could not find user `{user}`. Usage: `.purge from <user id|username> [count]`")
+
+        async def id_range(status_id):
+            # Only valid in channels: elsewhere these ids may belong to other chats.
+            for message_id in range(status_id - 1, min_id, -1):
+                yield message_id
+
+        async def matching_messages(status_id):
+            # `max_id` keeps the progress message itself out of the purge.
+            async for message in self._client.iter_messages(chat, limit=count, min_id=min_id, max_id=status_id, **search):
+                yield message.id
+
+        if event.is_reply and not search and count is None and event.is_channel:
+            await self._run_purge(event, id_range)
+        else:
+            await self._run_purge(event, matching_messages)
+
+    async def purge_mine(self, event):
+        """Handles `.purgeme [here]` to delete my indexed messages across all chats."""
+        here = event.pattern_match.group(1)
+        chats = [(event.chat_id, self.message_index.get(event.chat_id))] if here else list(self.message_index.chats())
+        rate_limiter = RateLimiter(constants.PURGEME_BATCH_INTERVAL)
+        progress = ProgressMessage(event)
+        deleted = failed = 0
+
+        for index, (chat_id, ids) in enumerate(chats, 1):
+            ids = [message_id for message_id in ids if message_id != event.id]
+            chat_deleted = []
+            for start in range(0, len(ids), constants.PURGE_CHUNK_SIZE):
+                chunk = ids[start:start + constants.PURGE_CHUNK_SIZE]
+                await rate_limiter.wait()
+                try:
+                    await retry_on_flood_wait(self._client.delete_messages, chat_id, chunk)
+                    deleted += len(chunk)
+                    chat_deleted.extend(chunk)
+                except Exception as e:
+                    failed += len(chunk)
+                    logger.warning(f"Failed to delete {len(chunk)} of my messages in {chat_id}: {e}")
+                await progress.update(f"Purging my messages... chat {index}/{len(chats)}, {deleted} deleted so far.")
+            if chat_deleted:
+                await self.message_index.remove(chat_id, chat_deleted)
+
+        summary = f"Deleted {deleted} of my messages in {len(chats)} chat(s)!"
+        if failed:
+            summary += f" ({failed} could not be deleted)"
+        await progress.edit(summary)
+        await asyncio.sleep(3)
+        await event.delete()
@@ -1,68 +1,345 @@
 import asyncio
+import json
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import regex
 from telethon import events
 from loguru import logger
 
+import constants
+from utility import DebouncedFlush, write_json_atomic
+
+# Every known species, longest first so `Porygon-Z` wins over `Porygon` and `Mr. Mime` keeps its dot.
+SPECIES_PATTERN = '|'.join(regex.escape(name) for name in sorted(constants.POKEMON, key=len, reverse=True))
+# One Pokémon per line of Hexa's listing, e.g. `12. Pikachu - Lv. 25` or `Pikachu x3`.
+INVENTORY_LINE_REGEX = regex.compile(
+    rf"^\s*(?:\d+[.)]\s*)?({SPECIES_PATTERN})(?!\w)\s*(?:[x×]\s*(\d+))?",
+    regex.MULTILINE | regex.IGNORECASE
+)
+CATCH_REGEX = regex.compile(rf"You caught (?:a wild )?(?:✨\s*)?({SPECIES_PATTERN})(?!\w)", regex.IGNORECASE)
+
+
+class PokemonInventory:
+    """Indexed local count of owned Pokémon, keyed by lowercase species name."""
+
+    def __init__(self):
+        self._species = {name.lower() for name in constants.POKEMON}
+        self._counts: Dict[str, int] = {}
+        self._counted_catches = OrderedDict()  # Message ids already counted, so repeated edits count once
+
+    def _normalize(self, name: str) -> Optional[str]:
+        """Returns the lowercase species name, or None if it is not a known species."""
+        name = name.strip().lower()
+        return name if name in self._species else None
+
+    def count(self, name: str) -> int:
+        return self._counts.get(name, 0)
+
+    def owned(self, names: Iterable[str]) -> List[str]:
+        """Returns the given species that are currently owned."""
+        return [name for name in names if self._counts.get(name, 0) > 0]
+
+    def add(self, name: str, amount: int = 1) -> None:
+        self._counts[name] = self._counts.get(name, 0) + amount
+
+    def remove(self, name: str, amount: int = 1) -> None:
+        remaining = self._counts.get(name, 0) - amount
+        if remaining > 0:
+            self._counts[name] = remaining
+        else:
+            self._counts.pop(name, None)
+
+    def clear(self) -> None:
+        self._counts.clear()
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self._counts)
+
+    def load_counts(self, counts: Dict[str, int]) -> None:
+        """Restores counts saved with `counts()`, skipping unknown species."""
+        self._counts = {name: int(count) for name, count in counts.items() if name in self._species and int(count) > 0}
+
+    def replace_counts(self, other: 'PokemonInventory') -> None:
+        """Takes over the counts of another inventory, keeping our catch history."""
+        self._counts = dict(other._counts)
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def apply_listing(self, text: str) -> int:
+        """Sets the counts of every species found in a Hexa listing page. Returns the number of species parsed."""
+        parsed: Dict[str, int] = {}
+        for match in INVENTORY_LINE_REGEX.finditer(text):
+            name = self._normalize(match.group(1))
+            if name:
+                parsed[name] = parsed.get(name, 0) + int(match.group(2) or 1)
+        self._counts.update(parsed)
+        return len(parsed)
+
+    def apply_catch(self, message_id: int, text: str) -> Optional[str]:
+        """Counts the Pokémon from a catch message once per message. Returns its name if counted."""
+        if message_id in self._counted_catches:
+            return None
+        match = CATCH_REGEX.search(text)
+        name = self._normalize(match.group(1)) if match else None
+        if not name:
+            return None
+        self._counted_catches[message_id] = None
+        if len(self._counted_catches) > constants.RELEASE_CATCH_HISTORY_SIZE:
+            self._counted_catches.popitem(last=False)
+        self.add(name)
+        return name
+
+
+class ReplyWaiter:
+    """Lets a coroutine await the first Hexa update matching a predicate.
+
+    Every new or edited Hexa message is fed in with an increasing sequence
+    number and kept in a short buffer, so a caller that takes `position`
+    before sending a command or clicking a button also sees replies that
+    arrived before it started waiting, but never stale ones from earlier.
+    """
+
+    def __init__(self):
+        self._position = 0
+        self._recent = deque(maxlen=constants.RELEASE_REPLY_BUFFER_SIZE)
+        self._waiters: List[Tuple[int, Callable, asyncio.Future]] = []
+
+    @property
+    def position(self) -> int:
+        return self._position
+
+    def feed(self, message) -> None:
+        """Records an update and resolves every waiter it matches."""
+        self._position += 1
+        self._recent.append((self._position, message))
+        for after, predicate, future in self._waiters:
+            if not future.done() and predicate(message):
+                future.set_result(message)
+
+    async def wait_for(self, predicate: Callable, after: int, timeout: float):
+        """Returns the first update after `after` matching `predicate`, or raises `asyncio.TimeoutError`."""
+        for position, message in self._recent:
+            if position > after and predicate(message):
+                return message
+        entry = (after, predicate, asyncio.get_running_loop().create_future())
+        self._waiters.append(entry)
+        try:
+            return await asyncio.wait_for(entry[2], timeout)
+        finally:
+            self._waiters.remove(entry)
+
+
+class ReleaseWorker:
+    """Release queue and worker task for a single chat."""
+
+    def __init__(self, manager: 'PokemonReleaseManager', chat_id: int):
+        self.chat_id = chat_id
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+        self._manager = manager
+        self._inflight: Dict[asyncio.Task, str] = {}  # Release tasks started by this worker -> species
+
+    @property
+    def load(self) -> int:
+        return self.queue.qsize() + len(self._inflight)
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self) -> List[str]:
+        """Cancels the worker and its releases. Returns the species that were queued or in flight."""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        dropped = list(self._inflight.values())
+        for task in list(self._inflight):
+            task.cancel()
+        while not self.queue.empty():
+            dropped.append(self.queue.get_nowait())
+        return dropped
+
+    async def run(self) -> None:
+        """Idles until a species is queued; the manager's semaphore caps releases across all chats."""
+        while True:
+            pokemon = await self.queue.get()
+            task = asyncio.create_task(self._manager._process_release(self.chat_id, pokemon))
+            self._inflight[task] = pokemon
+            task.add_done_callback(lambda task: self._inflight.pop(task, None))
+
+
 class PokemonReleaseManager:
     def __init__(self, client):
         self.client = client
-        self.release_task = None  
-        self.running = False  
-        self.current_chat_id = None  # Stores the chat where `.release on` was used
+        self.workers: Dict[int, ReleaseWorker] = {}  # Chats where `.release on` was used
         self.release_list = set()  # Pokémon to be released
+        self.inventory = PokemonInventory()
+        self._pending_syncs: Dict[int, PokemonInventory] = {}  # Our listing command ids -> inventory being rebuilt
+        self.reply_waiter = ReplyWaiter()
+        self._queued = set()  # Species waiting in or being processed from any chat's queue
+        self.release_semaphore = asyncio.Semaphore(constants.RELEASE_CONCURRENCY)
+        self._restored_chats: List[int] = []
+        self._state_dirty = False
+        self._state_flusher = DebouncedFlush(self._write_state, constants.RELEASE_STATE_FLUSH_INTERVAL, lambda: self._state_dirty)
+        self._load_state()
+
+    @property
+    def running(self) -> bool:
+        return bool(self.workers)
+
+    def _load_state(self) -> None:
+        """Restores the release list, active chats and inventory saved by `_save_state`."""
+        try:
+            with open(constants.RELEASE_STATE_PATH, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load release state from `{constants.RELEASE_STATE_PATH}`: {e}")
+            return
+        self.release_list = set(state.get("release_list", []))
+        self._restored_chats = [int(chat_id) for chat_id in state.get("chats", [])]
+        self.inventory.load_counts(state.get("inventory", {}))
+
+    def _save_state(self) -> None:
+        """Schedules the release list, active chats and inventory to be written."""
+        self._state_dirty = True
+        self._state_flusher.schedule()
+
+    async def _write_state(self) -> None:
+        if not self._state_dirty:
+            return
+        self._state_dirty = False
+        state = {"release_list": sorted(self.release_list), "chats": sorted(self.workers), "inventory": self.inventory.counts()}
+        try:
+            await asyncio.to_thread(write_json_atomic, constants.RELEASE_STATE_PATH, state)
+        except OSError as e:
+            logger.warning(f"Could not save release state to `{constants.RELEASE_STATE_PATH}`: {e}")
+
+    def start(self) -> None:
+        """Restarts a release worker for every chat that was active before the last reconnect."""
+        for chat_id in self._restored_chats:
+            self._start_worker(chat_id)
+        self._restored_chats = []
+        if self.workers:
+            logger.info(f"Restored auto-release in {len(self.workers)} chat(s).")
+            for pokemon in self.inventory.owned(self.release_list):
+                self.enqueue(pokemon)
+
+    async def stop(self) -> None:
+        """Cancels every worker, keeping their chats in the saved state, and writes pending state."""
+        for worker in self.workers.values():
+            worker.stop()
+        await self._state_flusher.close()
+
+    def _start_worker(self, chat_id: int) -> None:
+        worker = ReleaseWorker(self, chat_id)
+        self.workers[chat_id] = worker
+        worker.start()
+
+    @staticmethod
+    def _find_button(message, text: str) -> Optional[Tuple[int, int]]:
+        """Returns the (row, column) of the first button containing `text`."""
+        for i, row in enumerate(message.buttons or []):
+            for j, button in enumerate(row):
+                if text in button.text:
+                    return i, j
+        return None
+
+    async def _release_one(self, chat_id: int, pokemon: str) -> bool:
+        """Sends `/release <pokemon>` and drives Hexa's confirmation buttons as soon as they appear."""
+        timeout = constants.RELEASE_REPLY_TIMEOUT
+        position = self.reply_waiter.position
+        request = await self.client.send_message(chat_id, f"/release {pokemon}")
+
+        try:
+            reply = await self.reply_waiter.wait_for(
+                lambda m: m.chat_id == chat_id and m.reply_to_msg_id == request.id,
+                after=position, timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"No reply from Hexa to `/release {pokemon}` within {timeout}s.")
+            return False
+
+        if not reply.buttons:
+            # Hexa answers without buttons when we don't own the species.
+            logger.info(f"Hexa refused to release {pokemon}: {reply.raw_text[:100]}")
+            self.inventory.remove(pokemon, self.inventory.count(pokemon))
+            self._save_state()
+            return False
 
-    async def release_pokemon(self):
-        """Releases Pokémon in the chat where `.release on` was used."""
-        while self.running:
-            try:
-                if not self.current_chat_id:
-                    logger.warning("No active chat ID for release. Stopping...")
-                    self.running = False
-                    return  
-
-                for pokemon in self.release_list:
-                    logger.info(f"Releasing {pokemon} in chat {self.current_chat_id}...")
-                    await self.client.send_message(self.current_chat_id, f"/release {pokemon}")
-
-                    await asyncio.sleep(2)
-                    async for message in self.client.iter_messages(self.current_chat_id, limit=1):
-                        if message.buttons:
-                            await message.click(0, 1)  
-                            await asyncio.sleep(4)
-                            async for updated_message in self.client.iter_messages(self.current_chat_id, limit=1):
-                                if updated_message.buttons:
-                                    for i, row in enumerate(updated_message.buttons):
-                                        for j, button in enumerate(row):
-                                            if 'Release' in button.text:
-                                                await updated_message.click(i, j)
-                                                logger.info(f"{pokemon} released!")
-
-                await asyncio.sleep(10)  
-
-            except Exception as e:
-                logger.error(f"Error: {e}")
-                await asyncio.sleep(5)  
+        position = self.reply_waiter.position
+        await reply.click(0, 1)
+        try:
+            confirmation = await self.reply_waiter.wait_for(
+                lambda m: m.chat_id == chat_id
+                and (m.id == reply.id or m.reply_to_msg_id == request.id)
+                and self._find_button(m, 'Release') is not None,
+                after=position, timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Hexa did not show the release confirmation for {pokemon} within {timeout}s.")
+            return False
+
+        await confirmation.click(*self._find_button(confirmation, 'Release'))
+        self.inventory.remove(pokemon)
+        self._save_state()
+        logger.info(f"{pokemon} released!")
+        return True
+
+    async def handle_hexa_update(self, event):
+        """Feeds Hexa's new and edited messages to the reply waiter."""
+        self.reply_waiter.feed(event.message)
+
+    def enqueue(self, pokemon: str) -> None:
+        """Queues a species on the least busy chat if auto-release is on and it isn't already queued.
+
+        The inventory belongs to the account, not the chat, so a species is
+        only ever queued in one chat at a time.
+        """
+        if not self.workers or pokemon not in self.release_list or pokemon in self._queued:
+            return
+        worker = min(self.workers.values(), key=lambda worker: worker.load)
+        self._queued.add(pokemon)
+        worker.queue.put_nowait(pokemon)
+
+    async def _process_release(self, chat_id: int, pokemon: str) -> None:
+        """Releases one queued species, re-queueing it while more copies are owned."""
+        try:
+            async with self.release_semaphore:
+                logger.info(f"Releasing {pokemon} in chat {chat_id}...")
+                released = await self._release_one(chat_id, pokemon)
+        except Exception as e:
+            logger.error(f"Error releasing {pokemon}: {e}")
+            released = False
+        finally:
+            self._queued.discard(pokemon)
+        if released and self.inventory.count(pokemon) > 0:
+            self.enqueue(pokemon)
 
     async def start_releasing(self, event):
         """Starts the auto-release process in the chat where the command was sent."""
-        if not self.running:
-            self.running = True
-            self.current_chat_id = event.chat_id  # Store chat ID
-            self.release_task = asyncio.create_task(self.release_pokemon())
+        if event.chat_id not in self.workers:
+            self._start_worker(event.chat_id)
+            self._save_state()
+            for pokemon in self.inventory.owned(self.release_list):
+                self.enqueue(pokemon)
             await event.edit(" Pokémon auto-release started in this chat!")  
         else:
-            await event.edit(" Release is already running!")  
+            await event.edit(" Release is already running in this chat!")  
 
     async def stop_releasing(self, event):
-        """Stops the release process."""
-        if self.running:
-            self.running = False
-            if self.release_task:
-                self.release_task.cancel()
-                self.release_task = None
-            self.current_chat_id = None  
-            await event.edit(" Pokémon auto-release stopped!")  
+        """Stops the release process in the chat where the command was sent."""
+        worker = self.workers.pop(event.chat_id, None)
+        if worker:
+            # Tasks cancelled before they start never reach their `finally`, so forget their species here.
+            for pokemon in worker.stop():
+                self._queued.discard(pokemon)
+            self._save_state()
+            await event.edit(" Pokémon auto-release stopped in this chat!")  
         else:
-            await event.edit(" No active release process.")  
+            await event.edit(" No active release process in this chat.")  
 
     async def add_pokemon(self, event):
         """Adds a Pokémon to the release list."""
@@ -72,6 +349,10 @@ class PokemonReleaseManager:
             return
         pokemon_name = args.strip().lower()
         self.release_list.add(pokemon_name)
+        self._save_state()
+        if self.inventory.count(pokemon_name) > 0:
+            # Species we don't own are queued later by a catch or `.release sync`.
+            self.enqueue(pokemon_name)
         await event.edit(f"**{pokemon_name.capitalize()}** added to the release list!")
 
     async def remove_pokemon(self, event):
@@ -83,6 +364,7 @@ class PokemonReleaseManager:
         pokemon_name = args.strip().lower()
         if pokemon_name in self.release_list:
             self.release_list.remove(pokemon_name)
+            self._save_state()
             await event.edit(f"**{pokemon_name.capitalize()}** removed from the release list!")
         else:
             await event.edit(f"**{pokemon_name.capitalize()}** is not in the release list.")
@@ -93,15 +375,72 @@ class PokemonReleaseManager:
             await event.edit("Your release list is empty!")
         else:
             release_list_str = ", ".join(sorted(self.release_list))
-            await event.edit(f"**Pokémon set for release:**\n{release_list_str}")
+            await event.edit(
+                f"**Pokémon set for release:**\n{release_list_str}\n\n"
+                f"Auto-release active in {len(self.workers)} chat(s)."
+            )
+
+    async def sync_inventory(self, event):
+        """Requests Hexa's Pokémon listing in this chat and rebuilds the local inventory from its reply.
+
+        The listing is parsed into a separate inventory that replaces the
+        live one only once it holds something, so a sync Hexa never answers
+        leaves the current inventory intact. Page edits are accepted for
+        `RELEASE_SYNC_WINDOW` seconds after the first reply.
+        """
+        staging = PokemonInventory()
+        position = self.reply_waiter.position
+        request = await self.client.send_message(event.chat_id, constants.HEXA_INVENTORY_COMMAND)
+        self._pending_syncs[request.id] = staging
+        await event.edit("Syncing Pokémon inventory from Hexa...")
+        try:
+            await self.reply_waiter.wait_for(
+                lambda m: m.chat_id == event.chat_id and m.reply_to_msg_id == request.id,
+                after=position, timeout=constants.RELEASE_REPLY_TIMEOUT
+            )
+            await asyncio.sleep(constants.RELEASE_SYNC_WINDOW)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._pending_syncs.pop(request.id, None)
+
+        if staging:
+            await event.edit(f"Inventory synced: {len(staging)} species owned.")
+        else:
+            await event.edit("Inventory sync failed: no listing from Hexa. The inventory was left unchanged.")
+
+    async def handle_inventory_listing(self, event):
+        """Parses Hexa's reply (and later page edits) to a listing command we sent."""
+        staging = self._pending_syncs.get(event.message.reply_to_msg_id)
+        if staging is None:
+            return
+        parsed = staging.apply_listing(event.raw_text)
+        logger.info(f"Inventory sync: parsed {parsed} species from Hexa's listing.")
+        if not staging:
+            return
+        self.inventory.replace_counts(staging)
+        self._save_state()
+        for pokemon in self.inventory.owned(self.release_list):
+            self.enqueue(pokemon)
+
+    async def track_catches(self, event):
+        """Adds Pokémon from Hexa's "You caught" messages to the local inventory."""
+        if "You caught" not in event.raw_text:
+            return
+        name = self.inventory.apply_catch(event.id, event.raw_text)
+        if name:
+            logger.debug(f"Inventory: caught {name} (now {self.inventory.count(name)}).")
+            self._save_state()
+            self.enqueue(name)
 
     async def show_release_help(self, event):
         """Shows available release commands."""
         release_help_message = """**Release Pokémon Commands**
-• `.release on` - Start auto-releasing Pokémon  
-• `.release off` - Stop auto-releasing Pokémon  
+• `.release on` - Start auto-releasing Pokémon in this chat  
+• `.release off` - Stop auto-releasing Pokémon in this chat  
 • `.release add <pokemon>` - Add a Pokémon to the release list  
 • `.release remove <pokemon>` - Remove a Pokémon from the release list  
 • `.release list` - Show the list of Pokémon set for release  
+• `.release sync` - Rebuild the owned Pokémon inventory from Hexa's listing  
 """
         await event.edit(release_help_message)
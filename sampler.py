@@ -0,0 +1,147 @@
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import constants
+
+OVERFLOW_STACK = '[other]'  # Bucket for new stacks once the table is full
+TRUNCATED_FRAME = '[truncated]'  # Root marker for stacks deeper than the depth limit
+
+SAMPLER_STATUS = "Sampler: {state}, {samples} samples over {elapsed:.0f}s, {stacks} unique stacks, {overflow} overflowed"
+
+
+class SamplingProfiler:
+    """Statistical profiler that samples the event loop thread's stack from a background thread.
+
+    Every `SAMPLER_INTERVAL` seconds the sampler reads the loop thread's
+    current frame from `sys._current_frames()` and folds it into a
+    `root;...;leaf -> count` table, the collapsed-stack format read by
+    flamegraph.pl, speedscope and inferno. Nothing is hooked into the
+    profiled code, so the cost is one stack walk per interval. The table
+    holds at most `SAMPLER_MAX_STACKS` entries; later unseen stacks are
+    counted under `[other]`.
+    """
+
+    __slots__ = (
+        '_interval',
+        '_max_stacks',
+        '_max_depth',
+        '_stacks',
+        '_samples',
+        '_overflow',
+        '_started_at',
+        '_elapsed',
+        '_target_thread_id',
+        '_thread',
+        '_stop_event',
+        '_labels'
+    )
+
+    def __init__(
+        self,
+        interval: float = constants.SAMPLER_INTERVAL,
+        max_stacks: int = constants.SAMPLER_MAX_STACKS,
+        max_depth: int = constants.SAMPLER_MAX_DEPTH
+    ) -> None:
+        self._interval = interval
+        self._max_stacks = max_stacks
+        self._max_depth = max_depth
+        self._stacks: Dict[str, int] = {}
+        self._samples: int = 0
+        self._overflow: int = 0
+        self._started_at: Optional[float] = None
+        self._elapsed: float = 0.0
+        self._target_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._labels: Dict[object, str] = {}  # Code object -> frame label, so labels are built once
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, thread_id: Optional[int] = None) -> bool:
+        """Starts sampling a thread, by default the calling one. Returns `False` if already running."""
+        if self._thread is not None:
+            return False
+        self._target_thread_id = thread_id or threading.get_ident()
+        self._stop_event.clear()
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> bool:
+        """Stops sampling, keeping the collected stacks. Returns `False` if not running."""
+        if self._thread is None:
+            return False
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self._elapsed += time.monotonic() - self._started_at
+        self._started_at = None
+        return True
+
+    def reset(self) -> None:
+        """Discards every collected sample."""
+        self._stacks = {}
+        self._samples = 0
+        self._overflow = 0
+        self._elapsed = 0.0
+        if self._started_at is not None:
+            self._started_at = time.monotonic()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'.replace(';', ':')
+        return label
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self._interval):
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue  # Target thread has exited
+            frames: List[str] = []
+            while frame is not None and len(frames) < self._max_depth:
+                frames.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if frame is not None:
+                frames.append(TRUNCATED_FRAME)
+            del frame
+            frames.reverse()
+            stack = ';'.join(frames)
+
+            self._samples += 1
+            if stack in self._stacks:
+                self._stacks[stack] += 1
+            elif len(self._stacks) < self._max_stacks:
+                self._stacks[stack] = 1
+            else:
+                self._overflow += 1
+
+    def status(self) -> str:
+        """Returns a one-line summary of the sampler."""
+        elapsed = self._elapsed
+        if self._started_at is not None:
+            elapsed += time.monotonic() - self._started_at
+        return SAMPLER_STATUS.format(
+            state='running' if self.running else 'stopped',
+            samples=self._samples,
+            elapsed=elapsed,
+            stacks=len(self._stacks),
+            overflow=self._overflow
+        )
+
+    def dump(self) -> str:
+        """Returns the collected samples as collapsed stacks, one `stack count` per line, hottest first."""
+        stacks = dict(self._stacks)  # Snapshot, the sampler thread may still be adding entries
+        if self._overflow:
+            stacks[OVERFLOW_STACK] = self._overflow
+        return '\n'.join(f'{stack} {count}' for stack, count in sorted(stacks.items(), key=lambda item: item[1], reverse=True))
+
+
+# Shared across Manager instances so a reconnect does not orphan a running sampler thread.
+sampling_profiler = SamplingProfiler()
@@ -0,0 +1,41 @@
+"""Runs untrusted pure-computation code for `.seval` in a separate, resource-limited process.
+
+Usage: python sandbox.py <memory_bytes> <cpu_seconds> < code
+
+The code is read from stdin and executed like `meval` does: the value of a
+trailing expression is printed after anything the code printed itself.
+Tracebacks go to stderr and the exit status is non-zero on failure.
+"""
+import ast
+import resource
+import sys
+import traceback
+
+
+def limit_resources(memory_bytes: int, cpu_seconds: int) -> None:
+    """Caps the address space and CPU time of this process."""
+    resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+
+
+def run(code: str) -> None:
+    """Executes `code`, printing the value of its last statement if it is an expression."""
+    tree = ast.parse(code, '<seval>')
+    last = None
+    if tree.body and isinstance(tree.body[-1], ast.Expr):
+        last = ast.Expression(tree.body.pop().value)
+    namespace = {'__name__': '__seval__'}
+    exec(compile(tree, '<seval>', 'exec'), namespace)
+    if last is not None:
+        result = eval(compile(last, '<seval>', 'eval'), namespace)
+        if result is not None:
+            print(result)
+
+
+if __name__ == '__main__':
+    limit_resources(int(sys.argv[1]), int(sys.argv[2]))
+    try:
+        run(sys.stdin.read())
+    except BaseException:
+        traceback.print_exc()
+        sys.exit(1)
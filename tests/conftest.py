@@ -0,0 +1,10 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# constants.py reads these at import time and loads pokemon.json from the working directory.
+os.environ.setdefault('API_ID', '1')
+os.environ.setdefault('CHAT_ID', '1')
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
@@ -0,0 +1,40 @@
+import pytest
+
+from release import PokemonInventory
+
+
+@pytest.mark.parametrize('line, name, count', [
+    ('1. Porygon-Z - Lv. 5', 'porygon-z', 1),
+    ('2. Porygon - Lv. 5', 'porygon', 1),
+    ('Porygon2 x3', 'porygon2', 3),
+    ('Ho-oh x2', 'ho-oh', 2),
+    ('3. Mr. Mime - Lv. 12', 'mr. mime', 1),
+    ('Mime Jr. x4', 'mime jr.', 4),
+    ('Jangmo-o', 'jangmo-o', 1),
+    ('Hakamo-o x2', 'hakamo-o', 2),
+    ('10) Kommo-o • Lv. 60', 'kommo-o', 1),
+    ("Farfetch'd x2", "farfetch'd", 2),
+    ('Tapu Koko (shiny)', 'tapu koko', 1),
+])
+def test_listing_line(line, name, count):
+    inventory = PokemonInventory()
+    assert inventory.apply_listing(line) == 1
+    assert inventory.count(name) == count
+
+
+def test_listing_page_counts_every_line():
+    inventory = PokemonInventory()
+    assert inventory.apply_listing('1. Pikachu x2\n2. Porygon-Z - Lv. 5\n3. Not A Pokemon') == 2
+    assert inventory.count('pikachu') == 2
+    assert inventory.count('porygon') == 0
+
+
+@pytest.mark.parametrize('text, name', [
+    ('You caught a wild Mr. Mime!', 'mr. mime'),
+    ('You caught a wild Mime Jr.!', 'mime jr.'),
+    ('You caught a wild ✨ Porygon-Z!', 'porygon-z'),
+    ('You caught Ho-oh.', 'ho-oh'),
+    ('You caught a wild Kommo-o (Lv. 40)', 'kommo-o'),
+])
+def test_catch_message(text, name):
+    assert PokemonInventory().apply_catch(1, text) == name
@@ -0,0 +1,24 @@
+import asyncio
+import time
+
+import constants
+from evaluate import ExpressionEvaluator
+
+
+def evaluate(code):
+    return asyncio.run(ExpressionEvaluator(None)._evaluate_in_sandbox(code))
+
+
+def test_output_over_the_cap_is_truncated_quickly():
+    started = time.monotonic()
+    output = evaluate(f"print('x' * {3 * constants.SANDBOX_MAX_OUTPUT})")
+    assert output.endswith(f'[Output truncated at {constants.SANDBOX_MAX_OUTPUT} bytes, worker killed.]')
+    assert time.monotonic() - started < constants.SANDBOX_TIMEOUT / 2
+
+
+def test_result_of_last_expression_is_returned():
+    assert evaluate("x = 20\nx + 22").strip() == '42'
+
+
+def test_empty_output():
+    assert evaluate("x = 1") == 'No output.'
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from loguru import logger
+
+import constants
+from utility import DebouncedFlush
+
+
+def _now_us() -> int:
+    """Returns the current wall-clock time in microseconds."""
+    return time.time_ns() // 1000
+
+
+class HuntTracer:
+    """Records spans of a hunt cycle in the Trace Event Format.
+
+    Output is a JSON array of complete (`"ph": "X"`) and instant (`"ph": "i"`)
+    events, one trace id per encounter, that loads directly in
+    chrome://tracing or https://ui.perfetto.dev. The closing bracket is left
+    off, which the format explicitly allows, so events can be appended.
+    Only a `TRACE_SAMPLE_RATE` fraction of cycles is recorded; every call on
+    an unsampled cycle returns immediately. Finished traces are buffered and
+    written every `TRACE_FLUSH_INTERVAL` seconds off the event loop.
+    """
+
+    __slots__ = (
+        '_sample_rate',
+        '_path',
+        '_max_bytes',
+        '_backup_count',
+        '_trace_id',
+        '_trace_start',
+        '_open_spans',
+        '_events',
+        '_buffer',
+        '_flusher'
+    )
+
+    def __init__(
+        self,
+        sample_rate: float = constants.TRACE_SAMPLE_RATE,
+        path: str = constants.TRACE_FILE_PATH,
+        max_bytes: int = constants.TRACE_MAX_BYTES,
+        backup_count: int = constants.TRACE_BACKUP_COUNT
+    ) -> None:
+        self._sample_rate = sample_rate
+        self._path = path
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+        self._trace_id: Optional[str] = None
+        self._trace_start: int = 0
+        self._open_spans: Dict[str, int] = {}
+        self._events: List[dict] = []
+        self._buffer: List[dict] = []  # Events of finished traces awaiting the next flush
+        self._flusher = DebouncedFlush(self.flush, constants.TRACE_FLUSH_INTERVAL, lambda: self._buffer)
+
+    @property
+    def is_sampled(self) -> bool:
+        """Returns whether the current cycle is being recorded."""
+        return self._trace_id is not None
+
+    def start_trace(self) -> None:
+        """Ends the current trace, if any, and samples a new one."""
+        self.end_trace()
+        if self._sample_rate <= 0 or random.random() >= self._sample_rate:
+            return
+        self._trace_id = uuid.uuid4().hex[:16]
+        self._trace_start = _now_us()
+
+    def end_trace(self, **args) -> None:
+        """Closes the current trace and schedules its events to be written."""
+        if self._trace_id is None:
+            return
+        for name in list(self._open_spans):
+            self.end_span(name, unfinished=True)
+        self._emit('hunt_cycle', 'X', self._trace_start, _now_us() - self._trace_start, args)
+        self._trace_id = None
+        self._buffer.extend(self._events)
+        self._events = []
+        self._flusher.schedule()
+
+    async def close(self) -> None:
+        """Writes any buffered events now instead of waiting for the next flush."""
+        await self._flusher.close()
+
+    async def flush(self) -> None:
+        """Appends every buffered event to the trace file."""
+        events, self._buffer = self._buffer, []
+        if not events:
+            return
+        try:
+            await asyncio.to_thread(self._write, events)
+        except OSError as e:
+            logger.warning(f'[{self.__class__.__name__}] Failed to write trace file `{self._path}`: {e}')
+
+    def start_span(self, name: str) -> None:
+        """Opens a named span in the current trace."""
+        if self._trace_id is None:
+            return
+        self._open_spans[name] = _now_us()
+
+    def end_span(self, name: str, **args) -> None:
+        """Closes a named span opened with `start_span`, if it is open."""
+        if self._trace_id is None:
+            return
+        started = self._open_spans.pop(name, None)
+        if started is None:
+            return
+        self._emit(name, 'X', started, _now_us() - started, args)
+
+    @contextmanager
+    def span(self, name: str, **args) -> Iterator[None]:
+        """Context manager wrapping a block in a span."""
+        if self._trace_id is None:
+            yield
+            return
+        started = _now_us()
+        try:
+            yield
+        finally:
+            if self._trace_id is not None:
+                self._emit(name, 'X', started, _now_us() - started, args)
+
+    def instant(self, name: str, **args) -> None:
+        """Records a point-in-time event in the current trace."""
+        if self._trace_id is None:
+            return
+        self._emit(name, 'i', _now_us(), None, args)
+
+    def _emit(self, name: str, phase: str, ts: int, dur: Optional[int], args: dict) -> None:
+        event = {
+            'name': name,
+            'cat': 'hunt',
+            'ph': phase,
+            'ts': ts,
+            'pid': 1,
+            'tid': 1,
+            'args': {'trace_id': self._trace_id, **args}
+        }
+        if dur is not None:
+            event['dur'] = dur
+        else:
+            event['s'] = 't'
+        self._events.append(event)
+
+    def _rotate(self) -> None:
+        """Shifts `trace.json` -> `trace.json.1` -> ... dropping the oldest."""
+        for index in range(self._backup_count - 1, 0, -1):
+            source = f'{self._path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self._path}.{index + 1}')
+        if self._backup_count > 0:
+            os.replace(self._path, f'{self._path}.1')
+        else:
+            os.remove(self._path)
+
+    def _write(self, events: List[dict]) -> None:
+        os.makedirs(os.path.dirname(self._path) or '.', exist_ok=True)
+        if os.path.exists(self._path) and os.path.getsize(self._path) >= self._max_bytes:
+            self._rotate()
+        is_new = not os.path.exists(self._path)
+        with open(self._path, 'a', encoding='utf-8') as f:
+            if is_new:
+                f.write('[\n')
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False))
+                f.write(',\n')
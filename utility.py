@@ -1,5 +1,11 @@
+import asyncio
+import json
 import os
+import time
 from loguru import logger
+from telethon.errors import FloodWaitError, MessageNotModifiedError
+
+import constants
 
 
 def delete_if_exists(filepath):
@@ -16,3 +22,105 @@ def delete_if_exists(filepath):
             logger.debug(f'Error deleting file `{filepath}`: ', exc_info=True)
     else:
         logger.debug(f'File `{filepath}` does not exist.')
+
+
+async def retry_on_flood_wait(func, *args, retries=constants.FLOOD_WAIT_RETRIES, **kwargs):
+    """Awaits `func(*args, **kwargs)`, sleeping out FloodWait errors between attempts.
+
+    Args:
+        func: The coroutine function to call.
+        retries: How many times to retry after a FloodWait before re-raising it.
+
+    Returns:
+        Whatever `func` returns.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return await func(*args, **kwargs)
+        except FloodWaitError as e:
+            if attempt == retries:
+                raise
+            logger.warning(f'FloodWait of {e.seconds}s in `{func.__name__}`, retrying ({attempt + 1}/{retries}).')
+            await asyncio.sleep(e.seconds)
+
+
+class RateLimiter:
+    """Spaces out calls so that at most one starts every `interval` seconds."""
+
+    def __init__(self, interval):
+        self._interval = interval
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        """Sleeps until the caller's turn."""
+        async with self._lock:
+            now = time.monotonic()
+            if self._next_slot > now:
+                await asyncio.sleep(self._next_slot - now)
+            self._next_slot = max(now, self._next_slot) + self._interval
+
+
+class ProgressMessage:
+    """Edits a status message in place, skipping edits that would not change its text."""
+
+    def __init__(self, message, interval=constants.PROGRESS_EDIT_INTERVAL):
+        self._message = message
+        self._interval = interval
+        self._text = None
+        self._last_edit = time.monotonic()
+
+    async def update(self, text):
+        """Shows `text` if `interval` seconds have passed since the last edit."""
+        if time.monotonic() - self._last_edit >= self._interval:
+            await self.edit(text)
+
+    async def edit(self, text):
+        """Sets the message text unless it already reads `text`."""
+        self._last_edit = time.monotonic()
+        if text == self._text:
+            return
+        try:
+            await retry_on_flood_wait(self._message.edit, text)
+        except MessageNotModifiedError:
+            pass
+        self._text = text
+
+
+class DebouncedFlush:
+    """Runs `flush` `interval` seconds after the first `schedule()`, batching everything queued meanwhile."""
+
+    def __init__(self, flush, interval, pending):
+        self._flush = flush
+        self._interval = interval
+        self._pending = pending
+        self._task = None
+
+    def schedule(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        # Work queued while a flush is running finds this task still alive and
+        # does not schedule its own, so keep going until nothing is pending.
+        while True:
+            await asyncio.sleep(self._interval)
+            await self._flush()
+            if not self._pending():
+                return
+
+    async def close(self):
+        """Cancels the scheduled run and flushes whatever is pending right away."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self._flush()
+
+
+def write_json_atomic(path, data):
+    """Writes `data` as JSON to `path` through a temporary file, so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+    os.replace(f'{path}.tmp', path)